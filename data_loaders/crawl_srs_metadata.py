@@ -3,27 +3,240 @@
 # Last update: 26.01.2021
 
 import os
-import re
 import sys
+import time
+import random
+import socket
+import threading
+import itertools
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
 import datetime
-import praw
-from prawcore.exceptions import Forbidden, NotFound
 import json
-import numpy as np
+from data_loaders.crawl_store import CrawlStore
+try:
+    import praw
+    from prawcore.exceptions import Forbidden, NotFound, Redirect, ResponseException, RequestException
+except ImportError:  # needed only for the PrawClient (e.g., not needed when crawling a local fake server)
+    praw = None
 
+###################################################### Configurations ##################################################
 data_path = '' # NEED TO SET UP YOUR LOCAL DATA PATH
+requests_per_second = 1.0   # the API quota (Reddit allows 60 requests per minute per OAuth client)
+burst_size = 5              # amount of requests which can be sent at once after an idle period
+max_in_flight = 16          # maximum amount of requests waiting for a response at the same time
+max_retries = 5             # retries of a single SR in case of a transient error (e.g., 429 or 5xx responses)
+backoff_base_sec = 2.0
+backoff_max_sec = 120.0
+crawl_store_file_name = 'srs_meta_data_crawl.sqlite'   # crawl journal and output, the json file is exported from it
+flush_every_records = 1000
+flush_every_sec = 60
+########################################################################################################################
 
 
-def crawl_srs_meta_data(reddit_obj):
+class TransientCrawlError(Exception):
+    """
+    an error which is worth retrying (rate limiting, server errors, network problems)
+    :param retry_after: float or None, default: None
+        seconds to wait before retrying, in case the server asked for it
+    """
+    def __init__(self, message, retry_after=None):
+        super(TransientCrawlError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class SrMetadataClient(object):
+    """
+    interface of the clients used by the crawler. A client gets a single SR name and returns its meta-data
+    """
+    def fetch(self, sr_name):
+        """
+        fetching the meta-data of a single SR. Called from a few threads at the same time
+        :param sr_name: str
+            name of the SR
+        :return: dict or None
+            the SR meta-data (as returned by the 'about' API), None in case the SR does not exist or is private
+        :raises TransientCrawlError: in case the request should be retried
+        """
+        raise NotImplementedError
+
+
+class PrawClient(SrMetadataClient):
+    """
+    client using the PRAW package (Reddit API). PRAW objects are not thread-safe, hence each crawling thread uses its
+    own praw.Reddit object, created on its first request.
+    Note that each praw.Reddit object also has its own (prawcore) rate limiter, which follows the quota headers
+    returned by Reddit. It might add waits on top of the crawler token bucket, so the crawling rate can be lower than
+    'requests_per_second' (but never higher)
+    :param reddit_factory: function
+        function with no arguments returning a new praw.Reddit object (e.g., a lambda calling praw.Reddit with the
+        credentials)
+    """
+    def __init__(self, reddit_factory):
+        self.reddit_factory = reddit_factory
+        self._thread_data = threading.local()
+
+    def _reddit_obj(self):
+        if getattr(self._thread_data, 'reddit_obj', None) is None:
+            self._thread_data.reddit_obj = self.reddit_factory()
+        return self._thread_data.reddit_obj
+
+    def fetch(self, sr_name):
+        try:
+            cur_sr_obj = self._reddit_obj().subreddit(sr_name)
+            # the SR object is lazy, the request is sent once an attribute is used
+            cur_sr_obj.subscribers
+        except (NotFound, Forbidden, Redirect):
+            return None
+        except ResponseException as e:
+            if e.response.status_code == 429 or e.response.status_code >= 500:
+                raise TransientCrawlError(str(e), retry_after=_retry_after(e.response.headers))
+            raise
+        except RequestException as e:
+            raise TransientCrawlError(str(e))
+        cur_sr_info = vars(cur_sr_obj).copy()
+        # removing a problematic key from the list (it is a Reddit object key)
+        cur_sr_info.pop('_reddit', None)
+        return cur_sr_info
+
+
+class HttpJsonClient(SrMetadataClient):
+    """
+    client reading the '<base_url>/r/<sr_name>/about.json' pages with plain http requests. Useful for crawling through
+    a proxy or for a local fake server (tests and benchmarks)
+    :param base_url: str, default: 'https://www.reddit.com'
+        url of the server
+    :param headers: dict or None, default: None
+        http headers to add to each request (e.g., 'User-Agent' or 'Authorization')
+    :param timeout: float, default: 30
+        seconds to wait for a response
+    """
+    def __init__(self, base_url='https://www.reddit.com', headers=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.headers = dict() if headers is None else headers
+        self.timeout = timeout
+
+    def fetch(self, sr_name):
+        url = '{}/r/{}/about.json'.format(self.base_url, urllib.parse.quote(sr_name))
+        request = urllib.request.Request(url, headers=self.headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code in (403, 404):
+                return None
+            if e.code == 429 or e.code >= 500:
+                raise TransientCrawlError(str(e), retry_after=_retry_after(e.headers))
+            raise
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+            raise TransientCrawlError(str(e))
+        # SRs which do not exist are redirected to a search page (a listing)
+        if not isinstance(content, dict) or content.get('kind') != 't5':
+            return None
+        return content['data']
+
+
+class TokenBucket(object):
+    """
+    thread-safe token bucket rate limiter. Tokens are added at a constant rate, up to the bucket capacity, and each
+    request takes a single token (waiting for one if the bucket is empty)
+    :param rate: float
+        tokens added per second
+    :param capacity: float, default: 1
+        maximum amount of tokens, i.e., the amount of requests which can be sent at once after an idle period
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_update) * self.rate)
+                self._last_update = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def crawl_srs_concurrently(client, srs_names, rate=None, in_flight=None, retries=None):
+    """
+    crawling the meta-data of many SRs, with a few requests waiting for a response at the same time. The requests
+    rate is limited by a token bucket (see 'TokenBucket'), so the throughput is bounded by the API quota rather than by
+    the round-trip time. Transient errors are retried with an exponential backoff (and jitter)
+    :param client: SrMetadataClient
+        the client used for each request (e.g., PrawClient or HttpJsonClient)
+    :param srs_names: iterable
+        names of the SRs to crawl. Consumed lazily, so it can be a generator
+    :param rate: float or None, default: None
+        maximum amount of requests per second (retries included). If None - 'requests_per_second' is used
+    :param in_flight: int or None, default: None
+        maximum amount of SRs being crawled at the same time. If None - 'max_in_flight' is used
+    :param retries: int or None, default: None
+        maximum amount of retries of a single SR. If None - 'max_retries' is used
+    :return: generator
+        yields a tuple of (sr_name, status, sr_info) per SR, in the order the crawling ends. Status is 'found',
+        'missing' (SR does not exist or is private, sr_info is None) or 'failed' (all retries failed, sr_info is None)
+    """
+    rate_limiter = TokenBucket(rate=requests_per_second if rate is None else rate, capacity=burst_size)
+    in_flight = max_in_flight if in_flight is None else in_flight
+    retries = max_retries if retries is None else retries
+    srs_names = iter(srs_names)
+    with ThreadPoolExecutor(max_workers=in_flight) as executor:
+        pending = {executor.submit(_crawl_single_sr, client, sr_name, rate_limiter, retries)
+                   for sr_name in itertools.islice(srs_names, in_flight)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for sr_name in itertools.islice(srs_names, 1):
+                    pending.add(executor.submit(_crawl_single_sr, client, sr_name, rate_limiter, retries))
+
+
+def _crawl_single_sr(client, sr_name, rate_limiter, retries):
+    for attempt in range(retries + 1):
+        rate_limiter.acquire()
+        try:
+            sr_info = client.fetch(sr_name)
+        except TransientCrawlError as e:
+            if attempt == retries:
+                return sr_name, 'failed', None
+            backoff = min(backoff_max_sec, backoff_base_sec * 2 ** attempt) * random.uniform(0.5, 1)
+            time.sleep(max(backoff, e.retry_after or 0))
+            continue
+        return sr_name, 'missing' if sr_info is None else 'found', sr_info
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def crawl_srs_meta_data(reddit_factory=None, client=None):
     """
     crawling meta data regaring SRs in reddit. Crawling is based on all SRs found in the csv files (containing all the
     submissions along a period of time)
-    :param reddit_obj: praw.Reddit
-        the API object which will be used for crawling
+    :param reddit_factory: function or None, default: None
+        function with no arguments returning a new praw.Reddit object, which will be used for crawling (one object per
+        crawling thread, see 'PrawClient'). Ignored in case a client is given
+    :param client: SrMetadataClient or None, default: None
+        the client which will be used for crawling. If None - a PrawClient of the 'reddit_factory' is used
     :return: None
-        saving all results to files
+        saving all results to files. Results are checkpointed into a sqlite file (see 'CrawlStore'), so a crawl
+        which was stopped continues from where it stopped, and exported as a json file with a line per SR at the end
     """
+    client = PrawClient(reddit_factory=reddit_factory) if client is None else client
     start_time = datetime.datetime.now()
     csvs_location = data_path + 'place_classifier_csvs/' if sys.platform == 'linux' \
         else data_path + 'place_classifier_csvs\\'
@@ -40,44 +253,33 @@ def crawl_srs_meta_data(reddit_obj):
     duration = (datetime.datetime.now() - start_time).seconds
     print("Total of {} srs were found. Up to now, took us {} sec. Moving to crawling phase".format(len(srs_found), duration))
 
-    # converting the SRs found to a list that will be ordered without the nan object
-    srs_found = sorted([sr for sr in srs_found if sr is not np.nan])
-    srs_metadata = []
-    for idx, cur_sr_name in enumerate(srs_found):
-        if type(cur_sr_name) is not str:
-            continue
-        try:
-            cur_sr_obj = reddit_obj.subreddit(cur_sr_name)
-        except Forbidden as e:
-            continue
-        try:
-            cur_sr_obj.subscribers
-        except (NotFound, Forbidden) as e:
-            continue
-        cur_sr_info = vars(cur_sr_obj)
-        # removing a problematic key from the list (it is a Reddit object key)
-        cur_sr_info.pop('_reddit', None)
-        # adding the SR data to the list of data
-        srs_metadata.append(cur_sr_info)
-        #cur_sr_subscribers = cur_sr_info['subscribers']
-        # each 5000 SRs, we will save results and print to screen the status
-        if idx % 5000 == 0:
-            saving_loc = data_path + '/srs_meta_data.json' if sys.platform == 'linux' else data_path + '\\srs_meta_data.json'
-            with open(saving_loc, 'a') as f:
-                for sr in srs_metadata:
-                    json.dump(sr, f)
-                    f.write('\n')
-            duration = (datetime.datetime.now() - start_time).seconds
-            print("We are along the crawling phase. Tried to crawl up to now {} SRs, found {}."
-                  "took us up to now {} sec".format(idx, len(srs_metadata), duration))
-            srs_metadata = []
+    # converting the SRs found to a list that will be ordered without the nan object (and any other non string)
+    srs_found = sorted([sr for sr in srs_found if type(sr) is str])
+    saving_loc = data_path + '/srs_meta_data.json' if sys.platform == 'linux' else data_path + '\\srs_meta_data.json'
+    store_loc = os.path.join(data_path, crawl_store_file_name)
+    with CrawlStore(db_path=store_loc, flush_every_records=flush_every_records,
+                    flush_every_sec=flush_every_sec) as crawl_store:
+        # SRs crawled in former runs are skipped (SRs which failed are crawled again)
+        srs_done = crawl_store.done_names()
+        srs_to_crawl = [sr for sr in srs_found if sr not in srs_done]
+        print("{} srs were already crawled, {} are left".format(len(srs_found) - len(srs_to_crawl), len(srs_to_crawl)))
+        for idx, (cur_sr_name, status, cur_sr_info) in enumerate(crawl_srs_concurrently(client, srs_to_crawl), 1):
+            crawl_store.add(sr_name=cur_sr_name, status=status, sr_info=cur_sr_info)
+            # each 5000 SRs, we will print to screen the status
+            if idx % 5000 == 0:
+                duration = (datetime.datetime.now() - start_time).seconds
+                print("We are along the crawling phase. Tried to crawl up to now {} SRs. Took us up to now {} sec. "
+                      "Status: {}".format(idx, duration, crawl_store.stats()))
+        saved_amount = crawl_store.export_json(file_path=saving_loc)
+        duration = (datetime.datetime.now() - start_time).seconds
+        print("Crawling phase is done, {} SRs were saved to {}. Took us {} sec. "
+              "Status: {}".format(saved_amount, saving_loc, duration, crawl_store.stats()))
 
 
 if __name__ == "__main__":
-    # for the next line, need to set up all required IDs
-	reddit = praw.Reddit(client_id='',
-                         client_secret='',
-                         password='',
-                         user_agent='',
-                         username='')
-    crawl_srs_meta_data(reddit_obj=reddit)
+    # for the next line, need to set up all required IDs (a new praw.Reddit object is created for each crawling thread)
+    crawl_srs_meta_data(reddit_factory=lambda: praw.Reddit(client_id='',
+                                                           client_secret='',
+                                                           password='',
+                                                           user_agent='',
+                                                           username=''))
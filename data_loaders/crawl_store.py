@@ -0,0 +1,116 @@
+# Authors: Abraham Israeli
+# Python version: 3.7
+# Last update: 26.01.2021
+
+import os
+import time
+import json
+import sqlite3
+
+###################################################### Configurations ##################################################
+done_statuses = ('found', 'missing')   # SRs with these statuses are not crawled again, 'failed' ones are retried
+########################################################################################################################
+
+
+class CrawlStore(object):
+    """
+    checkpointed output of the SRs meta-data crawler, kept in a sqlite file. The store is keyed by the SR name, so
+    crawling an SR again replaces its former record instead of adding a duplicate, and it doubles as the crawl journal:
+    SRs which are already done (found or missing) can be skipped after a restart. Records are buffered in memory and
+    written in a single transaction once 'flush_every_records' records were added or 'flush_every_sec' seconds passed
+    since the last write, so a crash loses only the records of the last interval
+
+    :param db_path: str
+        full path of the sqlite file. Created in case it does not exist
+    :param flush_every_records: int, default: 1000
+        amount of buffered records which triggers a write
+    :param flush_every_sec: float, default: 60
+        seconds since the last write which trigger a write (checked whenever a record is added)
+    """
+    def __init__(self, db_path, flush_every_records=1000, flush_every_sec=60):
+        self.db_path = db_path
+        self.flush_every_records = flush_every_records
+        self.flush_every_sec = flush_every_sec
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS srs (sr_name TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                           "subscribers INTEGER, sr_info TEXT, crawl_time REAL NOT NULL)")
+        self._conn.commit()
+
+    def done_names(self):
+        """
+        names of the SRs which were already crawled, found or not (see 'done_statuses')
+        :return: set
+        """
+        query = "SELECT sr_name FROM srs WHERE status IN ({})".format(', '.join('?' * len(done_statuses)))
+        return {row[0] for row in self._conn.execute(query, done_statuses)}
+
+    def add(self, sr_name, status, sr_info=None):
+        """
+        adding the crawling result of a single SR. The record is buffered, and written along with the others once the
+        time or amount threshold is passed
+        :param sr_name: str
+            name of the SR (saved lower-cased)
+        :param status: str
+            'found', 'missing' or 'failed' (as returned by 'crawl_srs_concurrently')
+        :param sr_info: dict or None, default: None
+            the SR meta-data (relevant only to found SRs)
+        :return: None
+        """
+        subscribers = sr_info.get('subscribers') if sr_info is not None else None
+        self._buffer.append((sr_name.lower(), status, subscribers,
+                             None if sr_info is None else json.dumps(sr_info, default=str), time.time()))
+        if len(self._buffer) >= self.flush_every_records or \
+                time.monotonic() - self._last_flush >= self.flush_every_sec:
+            self.flush()
+
+    def flush(self):
+        """
+        writing all buffered records (a single transaction). A found SR is never replaced by a missing/failed
+        result of a later crawl, any other record replaces the former one
+        :return: None
+        """
+        with self._conn:
+            self._conn.executemany("INSERT INTO srs VALUES (?, ?, ?, ?, ?) ON CONFLICT(sr_name) DO UPDATE SET "
+                                   "status=excluded.status, subscribers=excluded.subscribers, "
+                                   "sr_info=excluded.sr_info, crawl_time=excluded.crawl_time "
+                                   "WHERE excluded.status = 'found' OR srs.status != 'found'", self._buffer)
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def stats(self):
+        """
+        amount of SRs per status (written records only)
+        :return: dict
+        """
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM srs GROUP BY status"))
+
+    def export_json(self, file_path):
+        """
+        saving (atomically) all found SRs as a json file with a line per SR, ordered by name. This is the format
+        'load_srs_meta_data' reads (see 'sr_metadata.py'), with no duplicated SRs
+        :param file_path: str
+            full path of the json file. Overridden in case it exists
+        :return: int
+            amount of SRs saved
+        """
+        self.flush()
+        saved_amount = 0
+        with open(file_path + '.tmp', 'w') as f:
+            for (sr_info,) in self._conn.execute("SELECT sr_info FROM srs WHERE status = 'found' ORDER BY sr_name"):
+                f.write(sr_info)
+                f.write('\n')
+                saved_amount += 1
+        os.replace(file_path + '.tmp', file_path)
+        return saved_amount
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -3,23 +3,40 @@
 # Last update: 26.01.2021
 
 import datetime
+import argparse
 import pandas as pd
 import numpy as np
 import re
 import sys
 import os
-import bz2
 import json
-import csv
-import lzma
-import pickle
-import collections
-from collections import OrderedDict, defaultdict
+import hashlib
+import itertools
+import multiprocessing as mp
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+from data_loaders.pushshift_io import open_zipped_file, open_chunk_writer, make_line_decoder, zipped_file_regex, \
+    save_partitioning_info, file_fingerprint, load_manifest_entry, save_manifest_entry, make_sr_prefilter
+from data_loaders.sr_statistics import load_sr_statistics
+from data_loaders.sr_metadata import load_srs_meta_data, load_place_related_srs, lookup_srs
 
 ###################################################### Configurations ##################################################
 data_path = ''# NEED TO SET UP YOUR LOCAL DATA PATH
 data_to_process = 'both'   # can be either 'submission' / 'comments' / 'both'
+processes_amount = 1   # number of zipped files to handle in parallel (each one by a different process)
+chunk_size = 100000   # rows to hold in memory before writing them to disk (None means holding a whole file)
+output_format = 'csv'   # can be either 'csv' / 'parquet'
+json_backend = 'auto'   # can be either 'auto' / 'simdjson' / 'orjson' / 'json'
+sr_buckets_amount = None   # if set, output files are partitioned by subreddit into this amount of hash buckets
+resume = True   # whether to skip/resume files which were (partially) converted in previous runs
 included_years = [2017]
+start_month = None   # YYYY-MM format. If no month/utc limit is given at all, the 'included_years' are used
+end_month = None   # YYYY-MM format
+min_utc = None   # epoch (int) or 'YYYY-MM-DD HH:MM:SS' string. Rows created before it are dropped
+max_utc = None   # epoch (int) or 'YYYY-MM-DD HH:MM:SS' string. Rows created after it are dropped
+cutoff_slack_seconds = 24 * 60 * 60   # a file is no longer read once a row created this long after the max_utc is found
 
 submission_columns = ['author_flair_css_class','saved', 'media', 'score', 'distinguished', 'from_id', 'title',
                       'num_comments', 'subreddit_id', 'link_flair_text', 'link_flair_css_class', 'stickied',
@@ -34,21 +51,61 @@ comments_columns = ['created_utc', 'link_id', 'subreddit_type', 'controversialit
 ########################################################################################################################
 
 
-def general_loader(data_path, sr_to_include=None, saving_path=os.getcwd(), load_only_columns_subset=False):
+def general_loader(data_path, sr_to_include=None, saving_path=os.getcwd(), load_only_columns_subset=False,
+                   processes_amount=1, chunk_size=100000, output_format='csv', json_backend='auto',
+                   sr_buckets_amount=None, resume=True, start_month=None, end_month=None, min_utc=None,
+                   max_utc=None):
     """
-    loading reddit data, based on the zipped files from here - https://files.pushshift.io/reddit/
-    the process converts this files into csv, after filtering some columns (if load_only_columns_subset=True) and
-    adding a date columns
+    loading reddit data, based on the zipped files from here - https://files.pushshift.io/reddit/ (.bz2, .xz or .zst)
+    the process converts this files into csv (or parquet), after filtering some columns
+    (if load_only_columns_subset=True) and adding a date columns
 
     :param data_path: str
         location of the data
     :param sr_to_include: list or None, default: NOne
-        placeholder for future use - to be used when only subset of SRs are needed
+        subreddits (case insensitive) to be included in the output. Other subreddits are dropped along the decoding
+        process, most of them even before the json is parsed (see 'pushshift_io.make_sr_prefilter').
+        If None - all subreddits are included
     :param saving_path: str, default: existing location of the python code
         location to save the files into
     :param load_only_columns_subset: bool, default: False
+    :param processes_amount: int, default: 1
+        number of worker processes to use. Each zipped file (a month of submissions or a month of comments) is handled
+        by a single worker, so there is no point in using more processes than files. If 1 - files are handled one
+        after the other in the current process
+    :param chunk_size: int or None, default: 100000
+        number of rows to hold in memory before writing them to the csv file. This keeps the memory usage flat no
+        matter how big the zipped file is. If None - the whole file is held in memory and written at the end
+    :param output_format: str, default: 'csv'
+        either 'csv' or 'parquet'. Parquet files are saved with explicit types (see 'pushshift_io.arrow_schema') and a
+        row group per chunk, so readers can load only the columns and row groups they need
+    :param json_backend: str, default: 'auto'
+        json parser to be used for the zipped files. See 'pushshift_io.make_line_decoder' for the options
+    :param sr_buckets_amount: int or None, default: None
+        if given, the output is partitioned by the lower-cased subreddit into this amount of hash buckets, each bucket
+        in a 'sr_bucket=XXXX' sub-folder of the 'saving_path' (e.g., 'sr_bucket=0042/RS_2017-04.csv'). This way,
+        reading the data of a few SRs (see 'get_submissions_subset') reads only their buckets and not all of Reddit.
+        Each bucket is a file opened by each worker, so it should be kept in the hundreds
+    :param resume: bool, default: True
+        whether to continue the work of previous runs. Each input file has an entry in a manifest (under the
+        '_manifest' folder of the 'saving_path') which is updated after each chunk. Files which were fully converted
+        are skipped, csv files which were partially converted are resumed from their last chunk (parquet ones are
+        converted from scratch). Files are written under a temporary name and renamed only once they are complete
+    :param start_month: str or None, default: None
+        the starting month in YYYY-MM format which data should be taken from. Files of earlier months are not opened.
+        If none of start_month, end_month, min_utc and max_utc is given, all months of the 'included_years' (see
+        configurations) are taken
+    :param end_month: str or None, default: None
+        the ending month in YYYY-MM format which data should be taken from
+    :param min_utc: int or str or None, default: None
+        the minimum creation time (epoch or 'YYYY-MM-DD HH:MM:SS' string, in UTC) of rows to include. Files of months
+        which end before it are not opened
+    :param max_utc: int or str or None, default: None
+        the maximum creation time of rows to include. Files of months which start after it are not opened. Since the
+        dumps are (almost) sorted by time, reading a file stops once a row created 'cutoff_slack_seconds' after it
+        is found
     :return: None
-        only prints to screen and saving csv files into the saving_path location
+        only prints to screen and saving csv/parquet files into the saving_path location
 
     Example
     -------
@@ -59,92 +116,271 @@ def general_loader(data_path, sr_to_include=None, saving_path=os.getcwd(), load_
     # finding all the relevant zip files in the 'data_path' directory
     submission_files_path = data_path + 'submissions/' if sys.platform == 'linux' else data_path + 'submissions\\'
     comments_files_path = data_path + 'comments/' if sys.platform == 'linux' else data_path + 'comments\\'
-    submission_files = [f for f in os.listdir(submission_files_path) if re.match(r'RS.*\.bz2|RS.*\.xz', f)]
-    comments_files = [f for f in os.listdir(comments_files_path) if re.match(r'RC.*\.bz2|RC.*\.xz', f)]
-    # taking only files which are in the 'included_years' subset
-    submission_files = [i for i in submission_files if 'RS_2017-04.bz2' <= i <= 'RS_2017-04.bz2']
-    comments_files = [i for i in comments_files if 'RC_2017-04.bz2' <= i <= 'RC_2017-04.bz2']
+    submission_files = [f for f in os.listdir(submission_files_path)
+                        if re.match(zipped_file_regex, f) and f.startswith('RS')]
+    comments_files = [f for f in os.listdir(comments_files_path)
+                      if re.match(zipped_file_regex, f) and f.startswith('RC')]
+    # taking only files which are in the required months (no matter what is the zipping format)
+    min_utc = _to_epoch(min_utc)
+    max_utc = _to_epoch(max_utc)
+    submission_files = [f for f in submission_files if _is_month_included(re.match(zipped_file_regex, f).group(2),
+                                                                          start_month, end_month, min_utc, max_utc)]
+    comments_files = [f for f in comments_files if _is_month_included(re.match(zipped_file_regex, f).group(2),
+                                                                      start_month, end_month, min_utc, max_utc)]
     submission_files = sorted(submission_files)
     comments_files = sorted(comments_files)
     submissions_interesting_col = ["created_utc_as_date", "author", "subreddit", "title", "selftext", "num_comments",
                                    "permalink", "score", "id", "thumbnail"]
     comments_interesting_col = ["created_utc_as_date", "author", "subreddit", "body", "score", "id",
                                 "link_id", "parent_id", "thumbnail"]
-    # looping over each file of the submission/comment and handling it
+    # each job is a single zipped file along with the columns to pull out of it
+    srs_to_include = None if sr_to_include is None else {str(sr_name).lower() for sr_name in sr_to_include}
+    job_params = {'saving_path': saving_path, 'srs_to_include': srs_to_include, 'chunk_size': chunk_size,
+                  'output_format': output_format, 'json_backend': json_backend, 'sr_buckets_amount': sr_buckets_amount,
+                  'resume': resume, 'min_utc': min_utc, 'max_utc': max_utc}
+    jobs = []
     if data_to_process == 'submission' or data_to_process == 'both':
-        # for cur_submission_file in submission_files[0]:
-        for subm_idx, cur_submission_file in enumerate(submission_files):
-            if cur_submission_file.endswith('bz2'):
-                zipped_submission = bz2.BZ2File(submission_files_path + cur_submission_file, 'r')
-            else:
-                zipped_submission = lzma.open(submission_files_path + cur_submission_file, mode='r')
-            # looping over each row in the submission data
-            submissions = []
-            for inner_idx, line in enumerate(zipped_submission):
-                try:
-                    cur_line = json.loads(line.decode('UTF-8'))
-                except json.decoder.JSONDecodeError:
-                    continue
-                cur_line['created_utc_as_date'] = str(pd.to_datetime(cur_line['created_utc'], unit='s'))
-                if load_only_columns_subset:
-                    line_shrinked = dict((k, cur_line[k]) if k in cur_line else (k, None) for k in submissions_interesting_col)
-                # we still define this 'line_shrinked' also in cases when we want to have all columns, since in some
-                # cases there are redundant columns appear in the zip original files
-                else:
-                    line_shrinked = dict((k, cur_line[k]) if k in cur_line else (k, None) for k in submission_columns)
-                submissions.append(line_shrinked)
-                #if inner_idx > 100000:
-                #    break
-            # saving the file to disk. Currently it is as a csv format (found it as the most useful one)
-            full_file_name = saving_path + '/' if sys.platform == 'linux' else saving_path + '\\'
-            f = open(full_file_name + cur_submission_file[:-4] + '.csv', mode='a', encoding="utf-8")
-            keys = submissions[0].keys()
-            with f as output_file:
-                dict_writer = csv.DictWriter(output_file, keys)
-                dict_writer.writeheader()
-                dict_writer.writerows(submissions)
-            duration = (datetime.datetime.now() - start_time).seconds
-            print("Finished handling the {}'th submission file called {}. Took us up to now: {} seconds. "
-                  "Current submission size is {}".format(subm_idx + 1, cur_submission_file, duration, len(submissions)))
-    # handling the comments data - exactly same logic as the submission data handling
+        columns = submissions_interesting_col if load_only_columns_subset else submission_columns
+        jobs += [dict(job_params, file_path=submission_files_path + f, columns=columns) for f in submission_files]
     if data_to_process == 'comments' or data_to_process == 'both':
-        for comm_idx, cur_comments_file in enumerate(comments_files):
-            if cur_comments_file.endswith('bz2'):
-                zipped_comments = bz2.BZ2File(comments_files_path + cur_comments_file, 'r')
-            else:
-                zipped_comments = lzma.open(comments_files_path + cur_comments_file, mode='r')
-            # looping over each row in the comments data
-            comments = []
-            for inner_idx, line in enumerate(zipped_comments):
+        columns = comments_interesting_col if load_only_columns_subset else comments_columns
+        jobs += [dict(job_params, file_path=comments_files_path + f, columns=columns) for f in comments_files]
+    print("{} files have been found and will be handled using {} process(es)".format(len(jobs), processes_amount))
+    if sr_buckets_amount is not None:
+        save_partitioning_info(saving_path=saving_path, sr_buckets_amount=sr_buckets_amount)
+
+    totals = {'files': 0, 'rows': 0, 'compressed_bytes': 0}
+    if processes_amount > 1 and len(jobs) > 1:
+        # largest files first, so a huge comments file will not be the last one to start
+        jobs.sort(key=lambda job: os.path.getsize(job['file_path']), reverse=True)
+        # a fresh process per file, so the peak memory reported is the one of the file itself
+        pool = mp.Pool(processes=min(processes_amount, len(jobs)), maxtasksperchild=1)
+        with pool as pool:
+            for file_stats in pool.imap_unordered(_convert_dump_file_job, jobs):
+                _report_progress(file_stats=file_stats, totals=totals, files_amount=len(jobs), start_time=start_time,
+                                 per_file_peak=True)
+    else:
+        for job in jobs:
+            file_stats = _convert_dump_file(**job)
+            _report_progress(file_stats=file_stats, totals=totals, files_amount=len(jobs), start_time=start_time,
+                             per_file_peak=False)
+    duration = (datetime.datetime.now() - start_time).seconds
+    print("Function 'general_loader' has ended. Took us : {} seconds. Total of {} files and {} rows were "
+          "handled".format(duration, totals['files'], totals['rows']))
+
+
+def _convert_dump_file(file_path, saving_path, columns, srs_to_include=None, chunk_size=None, output_format='csv',
+                       json_backend='auto', sr_buckets_amount=None, resume=True, min_utc=None, max_utc=None):
+    """
+    converting a single zipped file (a month of submissions or comments) into a csv file. This is a support function
+    to the 'general_loader' one, and it is the unit of work being sent to each of the worker processes.
+    The progress is saved into a manifest (see 'pushshift_io.save_manifest_entry') after each chunk, so a rerun skips
+    files that were already converted and resumes csv files that were partially converted
+    :param file_path: str
+        full path to the zipped file (.bz2, .xz or .zst)
+    :param saving_path: str
+        location to save the file into. File name is the same as the zipped one, with a .csv/.parquet suffix
+    :param columns: list
+        columns to pull out of each json row. Columns which do not exist in a row are saved as None
+    :param srs_to_include: set or None, default: None
+        lower-cased subreddit names to be included in the output. If None - all subreddits are included
+    :param chunk_size: int or None, default: None
+        number of rows to hold in memory before writing them to the file. If None - all rows are written at the end
+    :param output_format: str, default: 'csv'
+        either 'csv' or 'parquet'
+    :param json_backend: str, default: 'auto'
+        json parser to be used. See 'pushshift_io.make_line_decoder' for the options
+    :param sr_buckets_amount: int or None, default: None
+        if given, the output is partitioned by subreddit into this amount of hash buckets
+    :param resume: bool, default: True
+        whether to use the manifest of previous runs. If False, the file is converted from scratch
+    :param min_utc: int or None, default: None
+        rows created before this epoch are dropped
+    :param max_utc: int or None, default: None
+        rows created after this epoch are dropped. Once a row created 'cutoff_slack_seconds' after it is found, the
+        rest of the file is not read
+    :return: dict
+        statistics about the file handled: 'file_name', 'rows', 'compressed_bytes', 'duration' (in seconds),
+        'peak_rss_mb' (peak memory of the handling process, None if it cannot be measured) and 'status' (either
+        'converted', 'resumed' or 'skipped')
+    """
+    start_time = datetime.datetime.now()
+    file_name = os.path.basename(file_path)
+    fingerprint = file_fingerprint(file_path)
+    srs_hash = None if srs_to_include is None else \
+        hashlib.sha1('\n'.join(sorted(srs_to_include)).encode('UTF-8')).hexdigest()
+    run_params = {'columns': columns, 'output_format': output_format, 'sr_buckets_amount': sr_buckets_amount,
+                  'srs_to_include_hash': srs_hash, 'min_utc': min_utc, 'max_utc': max_utc}
+    entry = load_manifest_entry(saving_path=saving_path, file_name=file_name) if resume else None
+    # an entry is usable only if both the input file and the way we convert it are the same as in the previous run
+    if entry is not None and (entry['fingerprint'] != fingerprint or entry['run_params'] != run_params):
+        entry = None
+    if entry is not None and entry['status'] == 'done' and all(os.path.isfile(f) for f in entry['outputs']):
+        return {'file_name': file_name, 'rows': entry['rows_emitted'], 'compressed_bytes': fingerprint['size'],
+                'duration': (datetime.datetime.now() - start_time).total_seconds(), 'peak_rss_mb': _peak_rss_mb(),
+                'status': 'skipped'}
+    # parquet files cannot be resumed (their checkpoint has no 'outputs'), so they start from scratch
+    if entry is None or entry['status'] != 'in_progress' or entry['outputs'] is None:
+        entry = {'fingerprint': fingerprint, 'run_params': run_params, 'status': 'in_progress', 'lines_consumed': 0,
+                 'bytes_consumed': 0, 'rows_emitted': 0, 'outputs': dict()}
+    status = 'resumed' if entry['lines_consumed'] > 0 else 'converted'
+    lines_consumed = entry['lines_consumed']
+    bytes_consumed = entry['bytes_consumed']
+    rows_amount = entry['rows_emitted']
+    # the 'created_utc' value is always decoded, since the 'created_utc_as_date' column is based on it
+    keep_epoch = 'created_utc' in columns
+    keep_sr = 'subreddit' in columns
+    keys = columns + ([] if keep_epoch else ['created_utc']) + ([] if keep_sr else ['subreddit'])
+    decode_line = make_line_decoder(keys=keys, backend=json_backend)
+    keep_line = None if srs_to_include is None else make_sr_prefilter(srs_to_include=srs_to_include)
+    zipped_file = open_zipped_file(file_path=file_path)
+    # saving the file to disk. Csv format is the default one (found it as the most useful one)
+    writer = open_chunk_writer(file_path=os.path.join(saving_path, os.path.splitext(file_name)[0]), columns=columns,
+                               output_format=output_format, sr_buckets_amount=sr_buckets_amount,
+                               resume_sizes=entry['outputs'])
+    with zipped_file, writer:
+        # looping over each row in the zipped data, rows are written to disk once we have a full chunk of them.
+        # Lines which were handled before the last checkpoint of a previous run are skipped (without decoding them)
+        rows = []
+        epochs = []
+        for line in itertools.islice(zipped_file, lines_consumed, None):
+            lines_consumed += 1
+            bytes_consumed += len(line) + 1
+            # dropping lines of irrelevant subreddits before parsing them
+            if keep_line is not None and not keep_line(line):
+                continue
+            # we still pull out only the 'columns' also in cases when we want to have all columns, since in some
+            # cases there are redundant columns appear in the zip original files
+            try:
+                line_shrinked = decode_line(line)
+            except json.decoder.JSONDecodeError:
+                continue
+            cur_sr = line_shrinked['subreddit'] if keep_sr else line_shrinked.pop('subreddit')
+            if srs_to_include is not None and str(cur_sr).lower() not in srs_to_include:
+                continue
+            cur_epoch = line_shrinked['created_utc'] if keep_epoch else line_shrinked.pop('created_utc')
+            if min_utc is not None or max_utc is not None:
                 try:
-                    cur_line = json.loads(line.decode('UTF-8'))
-                except json.decoder.JSONDecodeError:
+                    cur_epoch_as_int = int(float(cur_epoch))
+                except (TypeError, ValueError):
+                    continue
+                if max_utc is not None and cur_epoch_as_int > max_utc + cutoff_slack_seconds:
+                    break
+                if (min_utc is not None and cur_epoch_as_int < min_utc) or \
+                        (max_utc is not None and cur_epoch_as_int > max_utc):
                     continue
-                cur_line['created_utc_as_date'] = pd.to_datetime(cur_line['created_utc'], unit='s')
-                if load_only_columns_subset:
-                    line_shrinked = dict((k, cur_line[k]) for k in comments_interesting_col if k in cur_line)
-                # we still define this 'line_shrinked' also in cases when we want to have all columns, since in some
-                # cases there are redundant columns appear in the zip original files
-                else:
-                    line_shrinked = dict((k, cur_line[k]) if k in cur_line else (k, None) for k in comments_columns)
-                comments.append(line_shrinked)
-                #if inner_idx > 100000:
-                #    break
-            # saving the file to disk
-            full_file_name = saving_path + '/' if sys.platform == 'linux' else saving_path + '\\'
-            f = open(full_file_name + cur_comments_file[:-4] + '.csv', mode='a', encoding="utf-8")
-            keys = comments[0].keys()
-            with f as output_file:
-                dict_writer = csv.DictWriter(output_file, keys)
-                dict_writer.writeheader()
-                dict_writer.writerows(comments)
-            duration = (datetime.datetime.now() - start_time).seconds
-            print("Finished handling the {}'th comments file. Took us up to now: {} seconds. "
-                  "Current comments size is {}".format(comm_idx+1, duration, len(comments)))
+            epochs.append(cur_epoch)
+            rows.append(line_shrinked)
+            if chunk_size is not None and len(rows) >= chunk_size:
+                _add_dates_to_rows(rows=rows, epochs=epochs)
+                writer.write_rows(rows)
+                rows_amount += len(rows)
+                rows = []
+                epochs = []
+                entry.update({'lines_consumed': lines_consumed, 'bytes_consumed': bytes_consumed,
+                              'rows_emitted': rows_amount, 'outputs': writer.checkpoint()})
+                save_manifest_entry(saving_path=saving_path, file_name=file_name, entry=entry)
+        _add_dates_to_rows(rows=rows, epochs=epochs)
+        writer.write_rows(rows)
+        rows_amount += len(rows)
+        outputs = writer.finalize()
+    entry.update({'status': 'done', 'lines_consumed': lines_consumed, 'bytes_consumed': bytes_consumed,
+                  'rows_emitted': rows_amount, 'outputs': outputs})
+    save_manifest_entry(saving_path=saving_path, file_name=file_name, entry=entry)
+    return {'file_name': file_name, 'rows': rows_amount, 'compressed_bytes': fingerprint['size'],
+            'duration': (datetime.datetime.now() - start_time).total_seconds(), 'peak_rss_mb': _peak_rss_mb(),
+            'status': status}
+
+
+def _to_epoch(utc_value):
+    """
+    converting a time limit given either as an epoch or as a string (e.g., '2017-03-29 00:00:00', in UTC) into an
+    epoch (int). None is returned as is
+    """
+    if utc_value is None or isinstance(utc_value, (int, np.integer)):
+        return utc_value
+    if isinstance(utc_value, (float, np.floating)):
+        return int(utc_value)
+    return int(pd.Timestamp(utc_value).timestamp())
+
+
+def _is_month_included(month, start_month, end_month, min_utc, max_utc):
+    """
+    deciding whether a month (YYYY-MM format) should be handled, based on the month/time limits given to the
+    'general_loader' function. In case no month limit and no utc limit are given, the 'included_years' configuration
+    is used
+    """
+    no_limits = start_month is None and end_month is None and min_utc is None and max_utc is None
+    if no_limits and int(month[0:4]) not in included_years:
+        return False
+    if (start_month is not None and month < start_month) or (end_month is not None and month > end_month):
+        return False
+    month_start = pd.Timestamp(month + '-01')
+    if max_utc is not None and month_start.timestamp() > max_utc:
+        return False
+    if min_utc is not None and (month_start + pd.offsets.MonthBegin(1)).timestamp() <= min_utc:
+        return False
+    return True
+
+
+def _add_dates_to_rows(rows, epochs):
+    """
+    adding the 'created_utc_as_date' value (e.g., '2017-04-01 00:00:00') to each row in a chunk. The conversion of the
+    epochs is done in a single vectorized pass over the whole chunk, which is much faster than doing it row by row
+    :param rows: list
+        list of dictionaries (rows), updated in place
+    :param epochs: list
+        the 'created_utc' value of each row (int or string, as given in the zipped files)
+    :return: None
+    """
+    if len(rows) == 0:
+        return
+    dates = pd.to_datetime(pd.to_numeric(pd.Series(epochs, dtype=object), errors='coerce'), unit='s')
+    dates_as_str = dates.astype(str).where(dates.notna(), None)
+    for row, cur_date in zip(rows, dates_as_str):
+        row['created_utc_as_date'] = cur_date
+
+
+def _peak_rss_mb():
+    """
+    peak resident memory (in MB) of the current process along its whole lifetime. None in case it cannot be measured
+    (e.g., on windows)
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports the value in KB, mac reports it in bytes
+    return peak_rss / 2**20 if sys.platform == 'darwin' else peak_rss / 2**10
+
+
+def _convert_dump_file_job(job):
+    # Pool.imap_unordered passes a single argument to the function, so we unpack it here
+    return _convert_dump_file(**job)
+
+
+def _report_progress(file_stats, totals, files_amount, start_time, per_file_peak):
+    """
+    printing to screen the status of the loading process, once a file has been handled. The 'totals' dictionary is
+    updated in place with the aggregated amounts of all files handled up to now. 'per_file_peak' tells whether the
+    file was handled in a fresh process (then the peak memory is the one of the file itself), otherwise the peak
+    memory is the one of the whole process up to now (i.e., of the largest file handled so far)
+    """
+    totals['files'] += 1
+    totals['rows'] += file_stats['rows']
+    totals['compressed_bytes'] += file_stats['compressed_bytes']
+    duration = max((datetime.datetime.now() - start_time).total_seconds(), 1e-6)
+    peak_rss = 'unknown' if file_stats['peak_rss_mb'] is None else '{:.0f} MB'.format(file_stats['peak_rss_mb'])
+    peak_rss = peak_rss if per_file_peak else peak_rss + ' (process peak so far)'
+    print("Finished handling file {}/{} called {} ({} {} rows, took {:.0f} seconds, peak memory {}). Up to now: {} "
+          "rows, {:.1f} MB of zipped data, {:.0f} seconds. Throughput: {:.0f} rows/sec, {:.2f} MB/sec"
+          "".format(totals['files'], files_amount, file_stats['file_name'], file_stats['status'], file_stats['rows'],
+                    file_stats['duration'], peak_rss, totals['rows'], totals['compressed_bytes'] / 2**20, duration,
+                    totals['rows'] / duration, totals['compressed_bytes'] / 2**20 / duration), flush=True)
 
 
 def sr_sample_based_subscribers(data_path, sample_size, threshold_to_define_as_drawing, internal_sr_metadata=True,
-                               sr_statistics_usage=True, balanced_sampling_based_sr_size=False, seed=1984):
+                               sr_statistics_usage=True, balanced_sampling_based_sr_size=False, seed=1984,
+                               start_period='2016-10', end_period='2017-03'):
     """
     sampling group of SRs to be later used for modeling. This group is in most cases the 'not-drawing' teams. We will
     use meta-data for sampling purposes, either internal meta-data or external one
@@ -174,6 +410,10 @@ def sr_sample_based_subscribers(data_path, sample_size, threshold_to_define_as_d
         without any submission data will not be chosen)
     :param seed: int, default: 1984
         the seed to be used for randomization
+    :param start_period: str, default: '2016-10'
+        the starting month (format: YYYY-MM) of the SR statistics window (relevant only if 'sr_statistics_usage')
+    :param end_period: str, default: '2017-03'
+        the ending month (format: YYYY-MM) of the SR statistics window (relevant only if 'sr_statistics_usage')
     :return: list of tuples
         list where each item is a SRs and contains some information about it (represented in a tuple):
         [0] contains its name, [1] contains num_of_users, [2] contains 'creation_utc', [3] contains string ('drawing'
@@ -181,21 +421,9 @@ def sr_sample_based_subscribers(data_path, sample_size, threshold_to_define_as_d
     """
     # in case we wish to use the data we crawled from reddit with explicit information about SRs writing along 2016-2017
     if internal_sr_metadata:
-        srs_meta_data = defaultdict(list)
-        with open(data_path + 'srs_meta_data_102016_to_032017.json') as f:
-            for idx, line in enumerate(f):
-                cur_line = json.loads(line)
-                cur_sr_name = str(cur_line['display_name']).lower()
-                # case we already 'met' this sr, we'll take the max out of all subscribers amount we see
-                if cur_sr_name in srs_meta_data:
-                    srs_meta_data[cur_sr_name] = [max(cur_line['subscribers'], srs_meta_data[cur_sr_name][0]),
-                                                  cur_line['created']]
-
-                elif cur_line['subscribers'] is not None:
-                    srs_meta_data[cur_sr_name] = [cur_line['subscribers'], cur_line['created']]
-        sr_basic = pd.DataFrame.from_dict(data=srs_meta_data, orient='index')
-        sr_basic.reset_index(inplace=True)
-        sr_basic.columns = ['subreddit_name', 'number_of_subscribers', 'creation_epoch']
+        # the json file is parsed once and cached, see 'sr_metadata.load_srs_meta_data'
+        sr_basic = load_srs_meta_data(file_path=data_path + 'srs_meta_data_102016_to_032017.json')
+        sr_basic = sr_basic[['subreddit_name', 'number_of_subscribers', 'creation_epoch']].reset_index(drop=True)
 
     # if we don't want to use the metadata information we crawled, we will use other source of information related to
     # the meta-data of subreddits (coming from https://files.pushshift.io/reddit/subreddits/)
@@ -210,66 +438,59 @@ def sr_sample_based_subscribers(data_path, sample_size, threshold_to_define_as_d
         sr_basic = sr_basic.loc[sr_basic['number_of_subscribers'] != 'None']
     sr_basic['number_of_subscribers'] = pd.to_numeric(sr_basic['number_of_subscribers'])
 
-    # adding explicit timestamp to the data and filtering SRs which were created before r/place started
-    sr_basic = sr_basic.assign(created_utc_as_date=pd.to_datetime(sr_basic['creation_epoch'], unit='s'))
+    # adding explicit timestamp and the lower-cased name (used for all joins below) to the data and filtering SRs
+    # which were created before r/place started
+    sr_basic = sr_basic.assign(created_utc_as_date=pd.to_datetime(sr_basic['creation_epoch'], unit='s'),
+                               sr_name=sr_basic['subreddit_name'].astype(str).str.lower())
     sr_basic = sr_basic[sr_basic['created_utc_as_date'] < '2017-03-31 00:00:00']
     sr_basic.sort_values(by='created_utc_as_date', inplace=True)
     # this is the excel file we created, including only SRs related in some way to the r/place experiment
-    place_related_srs = pd.read_excel(io=data_path + 'subreddits_revealed/'
-                                                     'all_subredditts_based_atlas_and_submissions.xlsx'
-                                      if sys.platform == 'linux' else data_path + 'sr_relations\\all_subredditts_based'
-                                                                                  '_atlas_and_submissions.xlsx',
-                                      sheet_name='Detailed list')
-    drawing_srs = place_related_srs[(place_related_srs['trying_to_draw'] == 'Yes') |
-                                    (place_related_srs['models_prediction'] > threshold_to_define_as_drawing)]['SR']
+    # (it is parsed once and cached, see 'sr_metadata.load_place_related_srs')
+    place_related_srs_file = data_path + 'subreddits_revealed/all_subredditts_based_atlas_and_submissions.xlsx' \
+        if sys.platform == 'linux' else data_path + 'sr_relations\\all_subredditts_based_atlas_and_submissions.xlsx'
+    place_related_srs = load_place_related_srs(file_path=place_related_srs_file, sheet_name='Detailed list')
+    drawing_srs = _drawing_srs_names(place_related_srs=place_related_srs,
+                                     threshold_to_define_as_drawing=threshold_to_define_as_drawing)
+    sr_basic_names = pd.Index(sr_basic['sr_name']).unique()
     # flag which determines whether we filter SRs based on the fact no submission was done by them in the last 6 months
     if sr_statistics_usage:
-        submission_stats = pickle.load(open(data_path +
-                                            "place_classifier_csvs/submission_stats_102016_to_032017.p", "rb"))
-        active_srs = set(str(key).lower() for key in submission_stats.keys())
-        drawing_srs = set([str(name).lower() for name in drawing_srs if str(name).lower() in active_srs])
-        sr_basic_names = set([str(name).lower() for name in sr_basic['subreddit_name'] if str(name).lower() in active_srs])
-    else:
-        drawing_srs = set([str(name).lower() for name in drawing_srs])
-        sr_basic_names = set([str(name).lower() for name in sr_basic['subreddit_name']])
-    not_drawing_srs = {name for name in sr_basic_names if name not in drawing_srs}
+        # monthly statistics are calculated once and saved, see 'sr_statistics.update_monthly_sr_statistics'
+        submission_stats = load_sr_statistics(files_path=os.path.join(data_path, 'place_classifier_csvs'),
+                                              prefix='RS', start_month=start_period, end_month=end_period)
+        drawing_srs = drawing_srs[drawing_srs.isin(submission_stats.index)]
+        sr_basic_names = sr_basic_names[sr_basic_names.isin(submission_stats.index)]
+    # anti-join, sorted by name (so sampling does not depend on any hashing order)
+    not_drawing_srs = sr_basic_names.difference(drawing_srs)
     # handling the sample size parameter
-    if type(sample_size) is str:
-        ratio = sample_size.split(':')
-        sample_amount = int(float(ratio[0])*1.0 / float(ratio[1])*1.0 * len(drawing_srs))
-    elif type(sample_size) is int and sample_size > 1:
-        sample_amount = sample_size
-    elif type(sample_size) is float and 0 < sample_size < 1:
-        sample_amount = int(sample_size * len(not_drawing_srs))
-    else:
+    sample_amount = _sample_amount(sample_size=sample_size, drawing_amount=len(drawing_srs),
+                                   not_drawing_amount=len(not_drawing_srs))
+    if sample_amount is None:
         print("Current parameter type is not supported yet")
         return 1
 
     # now sampling the 'not_drawing_srs' population
     if balanced_sampling_based_sr_size:
-        drawing_srs_df = sr_basic[sr_basic['subreddit_name'].str.lower().isin(drawing_srs)][
-            ['subreddit_name', 'number_of_subscribers']]
-        not_drawing_srs_df = sr_basic[sr_basic['subreddit_name'].str.lower().isin(not_drawing_srs)][
-            ['subreddit_name', 'number_of_subscribers']]
-        drawing_srs_dict = drawing_srs_df.set_index('subreddit_name').to_dict()['number_of_subscribers']
-        not_drawing_srs_dict = not_drawing_srs_df.set_index('subreddit_name').to_dict()['number_of_subscribers']
-        drawing_srs_dict = {k: int(v) for k, v in drawing_srs_dict.items()}
-        not_drawing_srs_dict = {k: int(v) for k, v in not_drawing_srs_dict.items()}
+        drawing_srs_df = sr_basic[sr_basic['sr_name'].isin(drawing_srs)]
+        not_drawing_srs_df = sr_basic[sr_basic['sr_name'].isin(not_drawing_srs)]
+        drawing_srs_dict = dict(zip(drawing_srs_df['subreddit_name'],
+                                    drawing_srs_df['number_of_subscribers'].astype('int64').tolist()))
+        not_drawing_srs_dict = dict(zip(not_drawing_srs_df['subreddit_name'],
+                                        not_drawing_srs_df['number_of_subscribers'].astype('int64').tolist()))
         chosen_srs, diffs = _sample_srs_based_size(drawing_srs_data=drawing_srs_dict,
                                                     not_drawing_srs_data=not_drawing_srs_dict, size=sample_amount)
     else:
-        np.random.seed(seed)
-        sampling_idx = set(np.random.choice(a=range(0, len(not_drawing_srs)-1), size=sample_amount, replace=False))
-        chosen_srs = [name for idx, name in enumerate(not_drawing_srs) if idx in sampling_idx]
-    chosen_srs_full_info = sr_basic[sr_basic['subreddit_name'].str.lower().isin(chosen_srs)][['subreddit_name',
-                                                                                              'number_of_subscribers',
-                                                                                              'created_utc_as_date']]
+        rng = np.random.default_rng(seed)
+        chosen_srs = rng.choice(not_drawing_srs.to_numpy(dtype=object), size=sample_amount, replace=False)
+    chosen_srs_full_info = sr_basic[sr_basic['sr_name'].isin(chosen_srs)]
     # returning results in a list format - each item is a tuple of 3. First is the name in lower-case letters,
     # second is the # of users in this SR and third is the creation date
-    results = [(str(x[1]).lower(), x[2], x[3], 'not_drawing') for x in chosen_srs_full_info.itertuples()]
+    results = _results_as_tuples(names=chosen_srs_full_info['sr_name'],
+                                 num_of_users=chosen_srs_full_info['number_of_subscribers'],
+                                 creation_utc=chosen_srs_full_info['created_utc_as_date'], label='not_drawing')
     # adding the drawing teams to the party and sending results
-    chosen_srs_full_info2 = place_related_srs[place_related_srs['SR'].isin(drawing_srs)][['SR', 'num_of_users', 'creation_utc']]
-    results2 = [(str(x[1]).lower(), x[2], x[3], 'drawing') for x in chosen_srs_full_info2.itertuples()]
+    chosen_srs_full_info2 = lookup_srs(sr_table=place_related_srs, sr_names=drawing_srs)
+    results2 = _results_as_tuples(names=chosen_srs_full_info2.index, num_of_users=chosen_srs_full_info2['num_of_users'],
+                                  creation_utc=chosen_srs_full_info2['creation_utc'], label='drawing')
     return results2 + results
 
 
@@ -277,7 +498,8 @@ def sr_sample_based_submissions(data_path, sample_size, threshold_to_define_as_d
                                 start_period='2017-01', end_period='2017-03', seed=1984):
     """
     sampling group of SRs to be later used for modeling. This group is in most cases the 'not-drawing' teams. We will
-    use meta-data for sampling purposes, either internal meta-data or external one
+    use meta-data for sampling purposes, either internal meta-data or external one. In order to create many samples
+    (e.g., different ratios or thresholds) use the 'SrSampler' object directly, so inputs are loaded only once
 
     :param data_path: str
         location of all data needed for the algorithm
@@ -301,91 +523,206 @@ def sr_sample_based_submissions(data_path, sample_size, threshold_to_define_as_d
         or 'not_drawing')
     """
     start_time = datetime.datetime.now()
+    sampler = SrSampler(data_path=data_path, start_period=start_period, end_period=end_period)
+    results = sampler.sample(sample_size=sample_size, threshold_to_define_as_drawing=threshold_to_define_as_drawing)
+    if results == 1:
+        return results
+    duration = (datetime.datetime.now() - start_time).seconds
+    print("'sr_sample_based_submissions' function has ended, total of {} not drawing teams and {} of drawing teams were"
+          " suggested to be used. Took us {} seconds".format(sum(1 for r in results if r[3] == 'not_drawing'),
+                                                              sum(1 for r in results if r[3] == 'drawing'), duration))
+    return results
 
-    # location of the csv
-    csv_path = os.path.join(data_path, 'place_classifier_csvs')
-    # finding all the relevant zip files in the 'data_path' directory
-    submission_files = [f for f in os.listdir(csv_path) if re.match(r'RS.*\.csv', f)]
-    # taking only the submissions files from 10-2016 to 03-2017 by default
-    submission_files = [i for i in submission_files if 'RS_' + start_period + '.csv' <= i <= 'RS_' + end_period + '.csv']
-    submission_files = sorted(submission_files)
-    tot_srs_counter = collections.Counter()
-    # iterating over each submission file
-    for subm_idx, cur_submission_file in enumerate(submission_files):
-        cur_submission_df = pd.read_csv(filepath_or_buffer=os.path.join(csv_path, cur_submission_file), encoding='utf-8')
-        # making sure the the date is not after r/place started
-        cur_submission_df = cur_submission_df[cur_submission_df['created_utc_as_date'] < '2017-03-29 00:00:00']
-        cur_sr_submissions = cur_submission_df["subreddit"].str.lower()
-        cur_srs_counter = collections.Counter(cur_sr_submissions)
-        tot_srs_counter = tot_srs_counter + cur_srs_counter
-    srs_counter_ordered = collections.OrderedDict(sorted(tot_srs_counter.items(), key=lambda t: t[1], reverse=True))
-    # in order to see the first (and highest SR) - list(srs_counter_ordered.items())[0]
-    # pulling out drawing srs information
-    place_related_srs = pd.read_excel(io=os.path.join(data_path, 'subreddits_revealed',
-                                                      'all_subredditts_based_atlas_and_submissions.xlsx'),
-                                      sheet_name='Detailed list')
-    drawing_srs = place_related_srs[(place_related_srs['trying_to_draw'] == 'Yes') |
-                                    (place_related_srs['models_prediction'] > threshold_to_define_as_drawing)]['SR']
-    # creating sets for the drawing/not-drawing teams
-    drawing_srs = set([str(name).lower() for name in drawing_srs
-                       if str(name).lower() in srs_counter_ordered.keys()])
-    sr_basic_names = set([str(name).lower() for name in srs_counter_ordered.keys()])
-    not_drawing_srs = {name for name in sr_basic_names if name not in drawing_srs}
-    # handling the sample size parameter
+
+class SrSampler(object):
+    """
+    sampling groups of SRs based on their amount of submissions (see 'sr_sample_based_submissions'). All inputs (SR
+    statistics, the r/place related SRs excel file and the SRs meta-data) are loaded once, when the object is
+    created, so many samples (e.g., different ratios, thresholds and seeds) can be created without reloading them
+
+    :param data_path: str
+        location of all data needed for the algorithm
+    :param start_period: str, default: '2017-01'
+        the starting month of the data (format: YYYY-MM)
+    :param end_period: str, default: '2017-03'
+        the ending month of the data (format: YYYY-MM)
+    :param max_utc: str, default: '2017-03-29 00:00:00' (a day before the start time of r/place experiment)
+        submissions created after this time are not taken into account
+
+    Example
+    -------
+    >>> sampler = SrSampler(data_path=data_path)
+    >>> results = sampler.sample(sample_size='2:1', threshold_to_define_as_drawing=0.7)
+    >>> results_df = sampler.sample_many(sample_sizes=['1:1', '2:1'], thresholds=[0.5, 0.7], seeds=range(10),
+    ...                                  method='random', processes_amount=4)
+    """
+    def __init__(self, data_path, start_period='2017-01', end_period='2017-03', max_utc='2017-03-29 00:00:00'):
+        # amount of submissions of each SR in the relevant months, making sure the the date is not after r/place
+        # started. Monthly statistics are calculated once and saved, see 'sr_statistics.update_monthly_sr_statistics'
+        sr_stats = load_sr_statistics(files_path=os.path.join(data_path, 'place_classifier_csvs'), prefix='RS',
+                                      start_month=start_period, end_month=end_period, max_utc=max_utc)
+        # (the statistics are ordered by the amount of submissions, highest first)
+        self.srs_submissions = sr_stats['submissions'].astype('int64')
+        # drawing srs information
+        self.place_related_srs = load_place_related_srs(file_path=os.path.join(data_path, 'subreddits_revealed',
+                                                                               'all_subredditts_based_atlas_and_'
+                                                                               'submissions.xlsx'),
+                                                        sheet_name='Detailed list')
+        # meta data about SRs, in order to return additional information about the returned SRs. This will include
+        # the SR size (users) and date of creation. Only SRs which were created before r/place started are kept
+        sr_basic = load_srs_meta_data(file_path=os.path.join(data_path, 'srs_meta_data_102016_to_032017.json'))
+        self.sr_basic = sr_basic[sr_basic['created_utc_as_date'] < '2017-03-31 00:00:00']
+
+    def sample(self, sample_size, threshold_to_define_as_drawing, seed=None, method='size_based'):
+        """
+        sampling a group of not-drawing SRs
+        :param sample_size: int or string of float
+            how many SRs should be sampled (see 'sr_sample_based_submissions')
+        :param threshold_to_define_as_drawing: float
+            a value to be used to define a SR as drawing, according to the value in the excel file
+        :param seed: int or None, default: None
+            random seed to be used (relevant only to the 'random' method)
+        :param method: str, default: 'size_based'
+            either 'size_based' (SRs are chosen so their submissions amount distribution is as close as possible to
+            the drawing SRs one, see '_sample_srs_based_size') or 'random'
+        :return: list of tuples
+            list where each item is a SRs and contains some information about it (represented in a tuple):
+            [0] contains its name, [1] contains num_of_users, [2] contains 'creation_utc', [3] contains string
+            ('drawing' or 'not_drawing'). 1 is returned in case the 'sample_size' is not supported
+        """
+        drawing_srs = _drawing_srs_names(place_related_srs=self.place_related_srs,
+                                         threshold_to_define_as_drawing=threshold_to_define_as_drawing)
+        # creating the drawing/not-drawing teams (join and anti-join with the SRs which have submissions)
+        is_drawing = self.srs_submissions.index.isin(drawing_srs)
+        drawing_srs = self.srs_submissions.index[is_drawing]
+        not_drawing_srs = self.srs_submissions.index[~is_drawing]
+        # handling the sample size parameter
+        sample_amount = _sample_amount(sample_size=sample_size, drawing_amount=len(drawing_srs),
+                                       not_drawing_amount=len(not_drawing_srs))
+        if sample_amount is None:
+            print("Current parameter type is not supported yet")
+            return 1
+        # now sampling the 'not_drawing_srs' population
+        if method == 'size_based':
+            drawing_srs_dict = dict(zip(drawing_srs, self.srs_submissions[is_drawing].tolist()))
+            not_drawing_srs_dict = dict(zip(not_drawing_srs, self.srs_submissions[~is_drawing].tolist()))
+            chosen_srs, diffs = _sample_srs_based_size(drawing_srs_data=drawing_srs_dict,
+                                                       not_drawing_srs_data=not_drawing_srs_dict, size=sample_amount)
+        elif method == 'random':
+            rng = np.random.default_rng(seed)
+            chosen_srs = rng.choice(not_drawing_srs.sort_values().to_numpy(dtype=object), size=sample_amount,
+                                    replace=False)
+        else:
+            raise IOError("Sampling method must be either 'size_based' or 'random'. Fix and try again")
+
+        # using the meta data, we will connect between the two (the index is the lower-cased name) and return
+        # the needed information
+        chosen_srs_full_info = lookup_srs(sr_table=self.sr_basic, sr_names=chosen_srs)
+        # returning results in a list format - each item is a tuple of 3. First is the name in lower-case letters,
+        # second is the # of users in this SR and third is the creation date
+        results = _results_as_tuples(names=chosen_srs_full_info.index,
+                                     num_of_users=chosen_srs_full_info['number_of_subscribers'],
+                                     creation_utc=chosen_srs_full_info['created_utc_as_date'], label='not_drawing')
+        # adding the drawing teams to the party and sending results
+        chosen_srs_full_info2 = lookup_srs(sr_table=self.place_related_srs, sr_names=drawing_srs)
+        results2 = _results_as_tuples(names=chosen_srs_full_info2.index,
+                                      num_of_users=chosen_srs_full_info2['num_of_users'],
+                                      creation_utc=chosen_srs_full_info2['creation_utc'], label='drawing')
+        return results2 + results
+
+    def sample_many(self, sample_sizes, thresholds, seeds=(None,), method='size_based', processes_amount=1):
+        """
+        sampling a group of not-drawing SRs for each combination of the given parameters (see 'sample'). In case
+        'processes_amount' > 1, combinations are sampled in parallel (each worker process gets a copy of the loaded
+        inputs once)
+        :param sample_sizes: list
+            'sample_size' values to use
+        :param thresholds: list
+            'threshold_to_define_as_drawing' values to use
+        :param seeds: list, default: (None,)
+            seeds to use. The 'size_based' method is deterministic, so seeds are relevant only to the 'random' one
+        :param method: str, default: 'size_based'
+            either 'size_based' or 'random'
+        :param processes_amount: int, default: 1
+            amount of combinations to sample in parallel
+        :return: pandas data-frame
+            a row per SR in each sample, with the following columns: 'sample_size', 'threshold', 'seed',
+            'subreddit', 'num_of_users', 'creation_utc' and 'label' ('drawing' or 'not_drawing'). Combinations
+            with a not supported 'sample_size' are not included
+        """
+        jobs = list(itertools.product(sample_sizes, thresholds, seeds))
+        if processes_amount > 1 and len(jobs) > 1:
+            pool = mp.Pool(processes=min(processes_amount, len(jobs)), initializer=_init_sampler_worker,
+                           initargs=(self,))
+            with pool as pool:
+                samples = pool.map(_sample_job, [job + (method,) for job in jobs])
+        else:
+            samples = [self.sample(sample_size=sample_size, threshold_to_define_as_drawing=threshold, seed=seed,
+                                   method=method) for sample_size, threshold, seed in jobs]
+        samples_dfs = []
+        for (sample_size, threshold, seed), results in zip(jobs, samples):
+            if results == 1:
+                continue
+            cur_df = pd.DataFrame(results, columns=['subreddit', 'num_of_users', 'creation_utc', 'label'])
+            cur_df.insert(0, 'seed', seed)
+            cur_df.insert(0, 'threshold', threshold)
+            cur_df.insert(0, 'sample_size', str(sample_size))
+            samples_dfs.append(cur_df)
+        if len(samples_dfs) == 0:
+            return pd.DataFrame(columns=['sample_size', 'threshold', 'seed', 'subreddit', 'num_of_users',
+                                         'creation_utc', 'label'])
+        return pd.concat(samples_dfs, ignore_index=True)
+
+
+_worker_sampler = None
+
+
+def _init_sampler_worker(sampler):
+    global _worker_sampler
+    _worker_sampler = sampler
+
+
+def _sample_job(job):
+    sample_size, threshold, seed, method = job
+    return _worker_sampler.sample(sample_size=sample_size, threshold_to_define_as_drawing=threshold, seed=seed,
+                                  method=method)
+
+
+def _drawing_srs_names(place_related_srs, threshold_to_define_as_drawing):
+    """
+    the (lower-cased) names of the drawing SRs: ones marked as trying to draw, or ones our model predicts as drawing
+    with a probability higher than the threshold
+    :param place_related_srs: pandas data-frame
+        as returned by 'sr_metadata.load_place_related_srs' (index is the lower-cased SR name)
+    :param threshold_to_define_as_drawing: float
+        a value to be used to define a SR as drawing, according to the 'models_prediction' value
+    :return: pandas Index
+        unique lower-cased names
+    """
+    is_drawing = (place_related_srs['trying_to_draw'] == 'Yes') | \
+                 (place_related_srs['models_prediction'] > threshold_to_define_as_drawing)
+    return place_related_srs.index[is_drawing.to_numpy()].unique()
+
+
+def _sample_amount(sample_size, drawing_amount, not_drawing_amount):
+    """
+    converting the 'sample_size' parameter of the sampling functions (see 'sr_sample_based_submissions') into the
+    amount of not-drawing SRs to sample
+    :return: int or None
+        None in case the 'sample_size' type is not supported
+    """
     if type(sample_size) is str:
         ratio = sample_size.split(':')
-        sample_amount = int(float(ratio[0])*1.0 / float(ratio[1])*1.0 * len(drawing_srs))
+        return int(float(ratio[0])*1.0 / float(ratio[1])*1.0 * drawing_amount)
     elif type(sample_size) is int and sample_size > 1:
-        sample_amount = sample_size
+        return sample_size
     elif type(sample_size) is float and 0 < sample_size < 1:
-        sample_amount = int(sample_size * len(not_drawing_srs))
-    else:
-        print("Current parameter type is not supported yet")
-        return 1
-    # now sampling the 'not_drawing_srs' population
+        return int(sample_size * not_drawing_amount)
+    return None
 
-    drawing_srs_dict = {str(k).lower(): int(v) for k, v in srs_counter_ordered.items() if k in drawing_srs}
-    not_drawing_srs_dict = {str(k).lower(): int(v) for k, v in srs_counter_ordered.items() if k in not_drawing_srs}
-    chosen_srs, diffs = _sample_srs_based_size(drawing_srs_data=drawing_srs_dict,
-                                               not_drawing_srs_data=not_drawing_srs_dict, size=sample_amount)
-
-    # loading file with meta data about SRs, in order to return additional information about the returned SRs
-    # this will include the SR size (users) and date of creation
-    srs_meta_data = defaultdict(list)
-    with open(os.path.join(data_path, 'srs_meta_data_102016_to_032017.json')) as f:
-        for idx, line in enumerate(f):
-            cur_line = json.loads(line)
-            cur_sr_name = str(cur_line['display_name']).lower()
-            # case we already 'met' this sr, we'll take the max out of all subscribers amount we see
-            if cur_sr_name in srs_meta_data:
-                srs_meta_data[cur_sr_name] = [max(cur_line['subscribers'], srs_meta_data[cur_sr_name][0]),
-                                              cur_line['created']]
-
-            elif cur_line['subscribers'] is not None:
-                srs_meta_data[cur_sr_name] = [cur_line['subscribers'], cur_line['created']]
-    sr_basic = pd.DataFrame.from_dict(data=srs_meta_data, orient='index')
-    sr_basic.reset_index(inplace=True)
-    sr_basic.columns = ['subreddit_name', 'number_of_subscribers', 'creation_epoch']
-    sr_basic['number_of_subscribers'] = pd.to_numeric(sr_basic['number_of_subscribers'])
-
-    # adding explicit timestamp to the data and filtering SRs which were created before r/place started
-    sr_basic = sr_basic.assign(created_utc_as_date=pd.to_datetime(sr_basic['creation_epoch'], unit='s'))
-    sr_basic = sr_basic[sr_basic['created_utc_as_date'] < '2017-03-31 00:00:00']
 
-    # using the data we pulled out, we will connect between the two and return the needed information
-    chosen_srs_full_info = sr_basic[sr_basic['subreddit_name'].str.lower().isin(chosen_srs)][['subreddit_name',
-                                                                                              'number_of_subscribers',
-                                                                                              'created_utc_as_date']]
-    # returning results in a list format - each item is a tuple of 3. First is the name in lower-case letters,
-    # second is the # of users in this SR and third is the creation date
-    results = [(str(x[1]).lower(), x[2], x[3], 'not_drawing') for x in chosen_srs_full_info.itertuples()]
-    # adding the drawing teams to the party and sending results
-    chosen_srs_full_info2 = place_related_srs[place_related_srs['SR'].isin(drawing_srs)][['SR', 'num_of_users', 'creation_utc']]
-    results2 = [(str(x[1]).lower(), x[2], x[3], 'drawing') for x in chosen_srs_full_info2.itertuples()]
-    duration = (datetime.datetime.now() - start_time).seconds
-    print("'sr_sample_based_submissions' function has ended, total of {} not drawing teams and {} of drawing teams were"
-          " suggested to be used. Took us {} seconds".format(len(results), len(results2), duration))
-    return results2 + results
+def _results_as_tuples(names, num_of_users, creation_utc, label):
+    return list(zip(names, num_of_users, creation_utc, [label] * len(names)))
 
 
 def _sample_srs_based_size(drawing_srs_data, not_drawing_srs_data, size):
@@ -412,11 +749,18 @@ def _sample_srs_based_size(drawing_srs_data, not_drawing_srs_data, size):
         print("Not possible to sample a subset larger than the origianl group size. 'size' must be smaller than the"
               "size of not_drawing_srs_data gropu. Try again please")
         return -1
-    # first value is the original index, second one is the value. It will be ordered lowest to highest
-    #drawing_srs_mapping = [(idx, value) for idx, value in enumerate(drawing_srs_data)]
-    #not_drawing_srs_mapping = [(idx, value) for idx, value in enumerate(not_drawing_srs_data)]
-    drawing_srs_mapping = list(OrderedDict(sorted(drawing_srs_data.items(), key=lambda x: x[1], reverse=False)).items())
-    not_drawing_srs_mapping = list(OrderedDict(sorted(not_drawing_srs_data.items(), key=lambda x: x[1], reverse=False)).items())
+    # the drawing values are ordered lowest to highest. The not_drawing ones are kept in a sorted array, and the ones
+    # which were already chosen are marked in a Fenwick tree (see '_AvailabilityTree'). Positions in the loop below
+    # ('not_drawing_cur_idx', 'chosen_idx') are ranks among the not_drawing SRs which were not chosen yet
+    drawing_values = [value for name, value in sorted(drawing_srs_data.items(), key=lambda x: x[1], reverse=False)]
+    not_drawing_names = np.array(list(not_drawing_srs_data.keys()), dtype=object)
+    not_drawing_values = np.array(list(not_drawing_srs_data.values()), dtype=np.int64)
+    # stable sorting, so ties are ordered in the same way python's 'sorted' orders them
+    sorting_idx = np.argsort(not_drawing_values, kind='stable')
+    not_drawing_names = not_drawing_names[sorting_idx].tolist()
+    not_drawing_values = not_drawing_values[sorting_idx]
+    values_as_list = not_drawing_values.tolist()
+    available = _AvailabilityTree(size=len(values_as_list))
     # some variables to handle the loop and the lookup process
     drawing_cur_idx = 0
     not_drawing_cur_idx = 0
@@ -424,33 +768,30 @@ def _sample_srs_based_size(drawing_srs_data, not_drawing_srs_data, size):
     chosen_srs = []
     # looping over and over till the list of indices we return is big enough
     while len(chosen_srs) < size:
-        drawing_cur_value = drawing_srs_mapping[drawing_cur_idx][1]
-        not_drawing_cur_value = not_drawing_srs_mapping[not_drawing_cur_idx][1]
-        highest_value_limit_flag = False
-        # inner loop, which looks for the best fit for the current candidate value
-        while not_drawing_cur_value < drawing_cur_value and not highest_value_limit_flag:
-            not_drawing_cur_idx += 1
-            try:
-                not_drawing_cur_value = not_drawing_srs_mapping[not_drawing_cur_idx][1]
-            # case the highest value in the not_drawing_list is lower than the value we look for
-            except IndexError:
-                not_drawing_cur_idx -= 1
-                not_drawing_cur_value = not_drawing_srs_mapping[not_drawing_cur_idx][1]
-                highest_value_limit_flag = True
-                print("Along the _sample_srs_based_size function, highest_value_limit_flag turned to True once")
+        drawing_cur_value = drawing_values[drawing_cur_idx]
+        # the best fit for the current candidate value is the first not_drawing SR which is not lower than it (binary
+        # search), but we never go backwards from the current position
+        lower_bound_rank = available.rank(int(np.searchsorted(not_drawing_values, drawing_cur_value, side='left')))
+        if lower_bound_rank < available.total:
+            not_drawing_cur_idx = max(not_drawing_cur_idx, lower_bound_rank)
+        # case the highest value in the not_drawing_list is lower than the value we look for
+        else:
+            not_drawing_cur_idx = available.total - 1
+            print("Along the _sample_srs_based_size function, highest_value_limit_flag turned to True once")
         # deciding which side to take (higher/lower than the the comparison to
+        upper_position = available.select(not_drawing_cur_idx)
         if not_drawing_cur_idx > 0:
-            lower_option = not_drawing_srs_mapping[not_drawing_cur_idx-1][1]
-            upper_option = not_drawing_cur_value
-            chosen_idx = (not_drawing_cur_idx - 1) if abs(drawing_cur_value-lower_option) <= \
-                                                      abs(drawing_cur_value-upper_option) else not_drawing_cur_idx
+            lower_position = available.select(not_drawing_cur_idx - 1)
+            chosen_position = lower_position if abs(drawing_cur_value - values_as_list[lower_position]) <= \
+                                                abs(drawing_cur_value - values_as_list[upper_position]) \
+                else upper_position
         else:
-            chosen_idx = 0
+            chosen_position = upper_position
         # adding the relevant name to the list of chosen indices
-        chosen_srs.append(not_drawing_srs_mapping[chosen_idx][0])
-        diffs.append(abs(drawing_cur_value - not_drawing_srs_mapping[chosen_idx][1]))
+        chosen_srs.append(not_drawing_names[chosen_position])
+        diffs.append(abs(drawing_cur_value - values_as_list[chosen_position]))
         # taking the instance we chose of of the big list, since we do not want to have duplications
-        not_drawing_srs_mapping.pop(chosen_idx)
+        available.remove(chosen_position)
         # since we took out an instance, we need to update the index of the not_drawing group
         not_drawing_cur_idx = max(0, not_drawing_cur_idx-1)
         # case we haven't reached the end of the drawing group, we will continue iterating over it
@@ -459,23 +800,90 @@ def _sample_srs_based_size(drawing_srs_data, not_drawing_srs_data, size):
         # case we did reach the end of this group, we will start a new "cycle" of sampling, but not from the begining,
         # since then our sample would be biased towrds small submissions amount SRs
         else:
-            drawing_cur_idx = int(len(drawing_srs_mapping) * 1.0 / 2.0)
+            drawing_cur_idx = int(len(drawing_values) * 1.0 / 2.0)
             not_drawing_cur_idx = 0
     print("Summary of the _sample_srs_based_size function: we sampled {} SRs."
           "Total difference according to the data is: {}".format(len(chosen_srs), sum(diffs)))
     return [sr.lower() for sr in chosen_srs], diffs
 
 
+class _AvailabilityTree(object):
+    """
+    a Fenwick (binary indexed) tree over a fixed amount of positions, each one is either available or not (all are
+    available at start). Support class to the '_sample_srs_based_size' function, so finding the k-th available position
+    and removing a position take O(log(n)) instead of the O(n) of a python list
+    """
+    def __init__(self, size):
+        # tree[i] (1-based) holds the amount of available positions in the (i - lowbit(i), i] range
+        positions = np.arange(1, size + 1)
+        self.tree = [0] + (positions & -positions).tolist()
+        self.size = size
+        self.total = size
+        self.top_bit = 1 << max(size.bit_length() - 1, 0)
+
+    def rank(self, position):
+        """ amount of available positions before the given (0-based) one """
+        count = 0
+        while position > 0:
+            count += self.tree[position]
+            position -= position & -position
+        return count
+
+    def select(self, k):
+        """ the (0-based) position of the k-th (0-based) available position """
+        position = 0
+        bit = self.top_bit
+        while bit > 0:
+            if position + bit <= self.size and self.tree[position + bit] <= k:
+                position += bit
+                k -= self.tree[position]
+            bit >>= 1
+        return position
+
+    def remove(self, position):
+        """ marking the given (0-based) position as not available """
+        self.total -= 1
+        position += 1
+        while position <= self.size:
+            self.tree[position] -= 1
+            position += position & -position
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converting the zipped Pushshift dumps (under <data_path>/submissions "
+                                                 "and <data_path>/comments) into monthly csv/parquet files")
+    parser.add_argument('--data_path', default=data_path)
+    parser.add_argument('--saving_path', default='/data/work/data/reddit_place/' + 'place_classifier_csvs')
+    parser.add_argument('--start_month', default=start_month, help="YYYY-MM format")
+    parser.add_argument('--end_month', default=end_month, help="YYYY-MM format")
+    parser.add_argument('--min_utc', default=min_utc, help="epoch or 'YYYY-MM-DD HH:MM:SS' (UTC)")
+    parser.add_argument('--max_utc', default=max_utc, help="epoch or 'YYYY-MM-DD HH:MM:SS' (UTC)")
+    parser.add_argument('--srs_file', default=None, help="file with the subreddits to include, a name per line")
+    parser.add_argument('--all_columns', action='store_true', help="save all columns and not only the interesting ones")
+    parser.add_argument('--processes_amount', type=int, default=processes_amount)
+    parser.add_argument('--chunk_size', type=int, default=chunk_size)
+    parser.add_argument('--output_format', default=output_format, choices=['csv', 'parquet'])
+    parser.add_argument('--json_backend', default=json_backend, choices=['auto', 'simdjson', 'orjson', 'json'])
+    parser.add_argument('--sr_buckets_amount', type=int, default=sr_buckets_amount)
+    parser.add_argument('--no_resume', action='store_true', help="convert all files from scratch")
+    args = parser.parse_args()
+
     start_time = datetime.datetime.now()
-    general_loader(data_path=data_path, saving_path='/data/work/data/reddit_place/' + 'place_classifier_csvs',
-                   load_only_columns_subset=True)
+    srs_to_include = None
+    if args.srs_file is not None:
+        with open(args.srs_file) as f:
+            srs_to_include = [line.strip() for line in f if line.strip()]
+    # time limits can be given either as an epoch or as a date string
+    args_min_utc = int(args.min_utc) if args.min_utc is not None and str(args.min_utc).isdigit() else args.min_utc
+    args_max_utc = int(args.max_utc) if args.max_utc is not None and str(args.max_utc).isdigit() else args.max_utc
+    general_loader(data_path=args.data_path, sr_to_include=srs_to_include, saving_path=args.saving_path,
+                   load_only_columns_subset=not args.all_columns, processes_amount=args.processes_amount,
+                   chunk_size=args.chunk_size, output_format=args.output_format, json_backend=args.json_backend,
+                   sr_buckets_amount=args.sr_buckets_amount, resume=not args.no_resume, start_month=args.start_month,
+                   end_month=args.end_month, min_utc=args_min_utc, max_utc=args_max_utc)
     #res = sr_sample_based_subscribers(data_path=data_path, sample_size='1:1', threshold_to_define_as_drawing=0.7)
     #res = sr_sample_based_submissions(data_path=data_path, sample_size='1.1:1', start_peoriod='2017-01',
     #                                  end_period='2017-03', threshold_to_define_as_drawing=0.7)
     duration = (datetime.datetime.now() - start_time).seconds
     #print("Finished. Res size is:{}, took us: {}". format(len(res), duration))
     print("Finished. Took us: {} seconds".format(duration))
-
-
-
@@ -0,0 +1,878 @@
+# Authors: Abraham Israeli
+# Python version: 3.7
+# Last update: 26.01.2021
+
+import os
+import collections
+import re
+import csv
+import json
+import bz2
+import lzma
+import queue
+import threading
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+try:
+    import orjson
+except ImportError:  # a faster json parser, the standard json module is used if it does not exist
+    orjson = None
+try:
+    import simdjson
+except ImportError:  # a faster json parser, the standard json module is used if it does not exist
+    simdjson = None
+try:
+    import zstandard
+except ImportError:  # needed only for the .zst files (Pushshift dumps from late 2018 onward)
+    zstandard = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+except ImportError:  # parquet files are an optional output, csv is always supported
+    pa = None
+    pq = None
+    pc = None
+
+###################################################### Configurations ##################################################
+output_formats = ['csv', 'parquet']
+json_backends = ['auto', 'simdjson', 'orjson', 'json']
+monthly_file_regex = r'^(R[SC])_(\d{4}-\d{2})\.(csv|parquet)$'
+zipped_file_regex = r'^(R[SC])_(\d{4}-\d{2}).*\.(bz2|xz|zst)$'
+zst_max_window_size = 2**31   # newer Pushshift dumps are compressed with the '--long=31' flag
+read_ahead_block_size = 2**22
+read_ahead_max_blocks = 8
+csv_read_chunk_size = 500000   # rows to parse at once when reading a subset out of a csv file
+max_read_workers = 8           # upper bound of threads reading monthly files at the same time
+json_read_chunk_size = 200000  # lines to decode before turning them into a data-frame, when reading json lines files
+partitioning_file_name = '_partitioning.json'
+manifest_dir_name = '_manifest'
+# the way the subreddit appears in each json line of the dumps, e.g., "subreddit":"place" or "subreddit": "place"
+sr_token_regex = re.compile(rb'"subreddit"\s*:\s*"([^"\\]*)"')
+# columns with a known type, all other columns (flairs, media, etc.) are saved as strings in the parquet files
+int_columns = {'created_utc', 'score', 'num_comments', 'ups', 'downs', 'gilded', 'controversiality', 'retrieved_on'}
+category_columns = {'subreddit'}
+timestamp_columns = {'created_utc_as_date'}
+########################################################################################################################
+
+
+def open_zipped_file(file_path, read_ahead=True):
+    """
+    opening a zipped Pushshift dump (.bz2, .xz or .zst) for reading it line by line
+    :param file_path: str
+        full path to the zipped file
+    :param read_ahead: bool, default: True
+        whether to decompress the file in a separate thread, ahead of the lines being consumed. All three
+        decompressors release the GIL, so the decompression runs in parallel to the json parsing of the lines
+    :return: iterable
+        the lines (bytes) of the file. Should be closed once done (can also be used as a context manager)
+    """
+    if file_path.endswith('.bz2'):
+        zipped_file = bz2.BZ2File(file_path, 'r')
+    elif file_path.endswith('.xz'):
+        zipped_file = lzma.open(file_path, mode='r')
+    elif file_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard must be installed in order to read .zst files")
+        decompressor = zstandard.ZstdDecompressor(max_window_size=zst_max_window_size)
+        zipped_file = decompressor.stream_reader(open(file_path, 'rb'), closefd=True)
+    else:
+        raise IOError("File {} is not a supported zipped file (.bz2, .xz or .zst)".format(file_path))
+    return ReadAheadLines(zipped_file) if read_ahead else _LinesReader(zipped_file)
+
+
+class _LinesReader(object):
+    def __init__(self, stream):
+        # same interface as the ReadAheadLines, reading the lines in the current thread
+        self._stream = stream
+
+    def __iter__(self):
+        remainder = b''
+        while True:
+            block = self._stream.read(read_ahead_block_size)
+            if not block:
+                break
+            lines = (remainder + block).split(b'\n')
+            remainder = lines.pop()
+            yield from lines
+        if remainder:
+            yield remainder
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ReadAheadLines(_LinesReader):
+    def __init__(self, stream):
+        """
+        reading the lines of a binary stream, while a background thread reads (decompresses) the next blocks of the
+        stream. At most 'read_ahead_max_blocks' blocks are held in memory
+        :param stream: binary file object
+            the stream to read from (e.g., a bz2.BZ2File object)
+        """
+        super(ReadAheadLines, self).__init__(stream)
+        self._blocks = queue.Queue(maxsize=read_ahead_max_blocks)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._read_blocks, daemon=True)
+        self._thread.start()
+
+    def _read_blocks(self):
+        try:
+            while not self._stop_event.is_set():
+                block = self._stream.read(read_ahead_block_size)
+                self._put(block)
+                if not block:
+                    break
+        except Exception as e:
+            # the error is raised in the consuming thread
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._blocks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        remainder = b''
+        while True:
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                break
+            lines = (remainder + block).split(b'\n')
+            remainder = lines.pop()
+            yield from lines
+        if remainder:
+            yield remainder
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._stream.close()
+
+
+def make_sr_prefilter(srs_to_include):
+    """
+    creating a function which decides whether a json line (bytes) might belong to one of the given subreddits, without
+    parsing the json. All the "subreddit":"..." tokens are pulled out of the raw line and looked up in a set. A line
+    might hold a few tokens (e.g., nested objects such as 'crosspost_parent_list' hold the subreddit of the original
+    post), so a line is kept if any of its tokens is in the set. Hence, lines which are dropped by it surely do not
+    belong to the subreddits, lines which pass it should still be checked after parsing (e.g., lines where no token
+    could be found, or where only a nested token is in the set, pass it)
+    :param srs_to_include: list or set
+        subreddit names (case insensitive)
+    :return: function
+        function getting a line (bytes) and returning a bool
+
+    Example
+    -------
+    >>> keep_line = make_sr_prefilter(srs_to_include=['place'])
+    >>> keep_line(b'{"id": "5zq2xa", "subreddit": "Place", "score": 10}')
+    True
+    >>> keep_line(b'{"crosspost_parent_list": [{"subreddit": "pics"}], "id": "5zq2xb", "subreddit": "place"}')
+    True
+    """
+    srs_as_bytes = {str(sr_name).lower().encode('UTF-8') for sr_name in srs_to_include}
+
+    def keep_line(line):
+        sr_tokens = sr_token_regex.findall(line)
+        return not sr_tokens or any(sr_token.lower() in srs_as_bytes for sr_token in sr_tokens)
+    return keep_line
+
+
+def make_line_decoder(keys, backend='auto'):
+    """
+    creating a function which decodes a single json line (bytes, as read from the zipped files) and returns only the
+    required keys out of it. Bytes are parsed directly, without decoding them into a string first
+    :param keys: list
+        keys to pull out of each json line. Keys which do not exist in a line get a None value
+    :param backend: str, default: 'auto'
+        json parser to use: 'simdjson' (the pysimdjson package), 'orjson' or 'json' (the standard library). 'auto'
+        takes the fastest one installed. simdjson parses lazily, so only the required keys are converted into python
+        objects, other parsers build the full dictionary first
+    :return: function
+        function getting a line (bytes) and returning a dictionary. In case the line is not a valid json, a
+        json.decoder.JSONDecodeError is raised (no matter which backend is used)
+
+    Example
+    -------
+    >>> decode_line = make_line_decoder(keys=['id', 'subreddit'])
+    >>> decode_line(b'{"id": "5zq2xa", "subreddit": "place", "score": 10}')
+    {'id': '5zq2xa', 'subreddit': 'place'}
+    """
+    if backend == 'auto':
+        backend = 'simdjson' if simdjson is not None else 'orjson' if orjson is not None else 'json'
+    if backend not in json_backends or (backend == 'simdjson' and simdjson is None) or \
+            (backend == 'orjson' and orjson is None):
+        raise IOError("json backend '{}' is not supported/installed. Must be one out of the following: "
+                      "{}".format(backend, json_backends))
+    if backend == 'simdjson':
+        parser = simdjson.Parser()
+
+        def decode_line(line):
+            try:
+                cur_line = parser.parse(line)
+            except ValueError as e:
+                raise json.decoder.JSONDecodeError(str(e), line.decode('UTF-8', errors='replace'), 0)
+            return {k: _simdjson_to_python(cur_line.get(k)) for k in keys}
+        return decode_line
+
+    loads = orjson.loads if backend == 'orjson' else json.loads
+
+    def decode_line(line):
+        # orjson.JSONDecodeError is a subclass of json.decoder.JSONDecodeError
+        cur_line = loads(line)
+        return {k: cur_line.get(k) for k in keys}
+    return decode_line
+
+
+def _simdjson_to_python(value):
+    # nested objects (e.g., 'media') are lazy simdjson proxies which become invalid once the next line is parsed
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
+
+
+def open_chunk_writer(file_path, columns, output_format='csv', sr_buckets_amount=None, resume_sizes=None):
+    """
+    opening a writer which gets rows (dictionaries) in chunks and saves them to disk. Rows are written into a
+    temporary file ('<file>.tmp') which replaces the final file only once the writer is finalized, so a crashed run
+    never leaves a partial file under the final name
+    :param file_path: str
+        full path of the file to write into, without the suffix (it is added according to the 'output_format')
+    :param columns: list
+        columns to be saved, in this order
+    :param output_format: str, default: 'csv'
+        either 'csv' or 'parquet'
+    :param sr_buckets_amount: int or None, default: None
+        if given, rows are partitioned by their (lower-cased) subreddit into this amount of hash buckets. Each bucket
+        is saved into its own 'sr_bucket=XXXX' sub-folder, under the folder of the 'file_path'
+    :param resume_sizes: dict or None, default: None
+        used to continue a previous (crashed) run. Maps each final file path to the size its temporary file had in the
+        last checkpoint (as returned by the 'checkpoint' function). Temporary files are truncated to these sizes and
+        new rows are appended to them. Only csv files can be resumed
+    :return: CsvChunkWriter or ParquetChunkWriter or PartitionedChunkWriter
+        object with a 'write_rows', 'checkpoint', 'finalize' and 'close' functions (can also be used as a context
+        manager, which closes the writer without finalizing it)
+    """
+    resume_sizes = dict() if resume_sizes is None else resume_sizes
+    if sr_buckets_amount is not None:
+        return PartitionedChunkWriter(file_path=file_path, columns=columns, output_format=output_format,
+                                      sr_buckets_amount=sr_buckets_amount, resume_sizes=resume_sizes)
+    if output_format == 'csv':
+        return CsvChunkWriter(file_path=file_path + '.csv', columns=columns,
+                              resume_size=resume_sizes.get(file_path + '.csv'))
+    elif output_format == 'parquet':
+        return ParquetChunkWriter(file_path=file_path + '.parquet', columns=columns)
+    else:
+        raise IOError("output_format must be one out of the following: {}. Fix and try again".format(output_formats))
+
+
+class _ChunkWriter(object):
+    # common logic of the single file writers - all rows are written into a temporary file, renamed once finalized
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.tmp_file_path = file_path + '.tmp'
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self._close()
+            self.closed = True
+
+    def finalize(self):
+        self.close()
+        os.replace(self.tmp_file_path, self.file_path)
+        return [self.file_path]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvChunkWriter(_ChunkWriter):
+    def __init__(self, file_path, columns, resume_size=None):
+        """
+        writing rows into a csv file, chunk after chunk. The header is written once the file is opened
+        :param file_path: str
+            full path of the csv file
+        :param columns: list
+            columns to be saved, in this order
+        :param resume_size: int or None, default: None
+            if given, the existing temporary file is truncated to this size (the size it had in the last checkpoint)
+            and rows are appended to it. Otherwise, a new file is created
+        """
+        super(CsvChunkWriter, self).__init__(file_path)
+        self.columns = columns
+        if resume_size is not None and os.path.isfile(self.tmp_file_path):
+            # dropping anything written after the last checkpoint
+            with open(self.tmp_file_path, 'r+b') as f:
+                f.truncate(resume_size)
+            self._file = open(self.tmp_file_path, mode='a', encoding="utf-8")
+            write_header = resume_size == 0
+        else:
+            self._file = open(self.tmp_file_path, mode='w', encoding="utf-8")
+            write_header = True
+        self._dict_writer = csv.DictWriter(self._file, columns)
+        if write_header:
+            self._dict_writer.writeheader()
+
+    def write_rows(self, rows):
+        self._dict_writer.writerows(rows)
+
+    def checkpoint(self):
+        """
+        making sure all rows written up to now are on disk
+        :return: dict
+            maps the final file path to the current size of the temporary file
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {self.file_path: os.path.getsize(self.tmp_file_path)}
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetChunkWriter(_ChunkWriter):
+    def __init__(self, file_path, columns):
+        """
+        writing rows into a parquet file, chunk after chunk. Each chunk is saved as a single row group, so readers can
+        skip row groups they do not need (e.g., based on the min/max dates of each group)
+        :param file_path: str
+            full path of the parquet file
+        :param columns: list
+            columns to be saved, in this order
+        """
+        if pq is None:
+            raise ImportError("pyarrow must be installed in order to save parquet files")
+        super(ParquetChunkWriter, self).__init__(file_path)
+        self.columns = columns
+        self.schema = arrow_schema(columns)
+        self._writer = pq.ParquetWriter(self.tmp_file_path, schema=self.schema, compression='zstd')
+
+    def write_rows(self, rows):
+        if len(rows) == 0:
+            return
+        arrays = [_to_arrow_array(values=[r[col] for r in rows], arrow_type=self.schema.field(col).type)
+                  for col in self.columns]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def checkpoint(self):
+        # a parquet file cannot be appended to once it is reopened, so it cannot be resumed
+        return None
+
+    def _close(self):
+        self._writer.close()
+
+
+class PartitionedChunkWriter(object):
+    def __init__(self, file_path, columns, output_format, sr_buckets_amount, resume_sizes=None):
+        """
+        writing rows into files which are partitioned by the subreddit of each row. A row of subreddit 'x' is saved
+        into 'sr_bucket=<sr_bucket(x)>/<file name>', next to the path given. Each bucket has its own writer, which
+        is opened only once the first row of the bucket arrives (so up to 'sr_buckets_amount' files are opened)
+        :param file_path: str
+            full path of the file to write into, without the suffix (e.g., '/data/place_classifier_csvs/RS_2017-01')
+        :param columns: list
+            columns to be saved, in this order. Must include the 'subreddit' column
+        :param output_format: str
+            either 'csv' or 'parquet'
+        :param sr_buckets_amount: int
+            amount of hash buckets to partition the rows into
+        :param resume_sizes: dict or None, default: None
+            see 'open_chunk_writer'. Buckets found in it are reopened right away
+        """
+        self.saving_path, self.file_name = os.path.split(file_path)
+        self.columns = columns
+        self.output_format = output_format
+        self.sr_buckets_amount = sr_buckets_amount
+        self.resume_sizes = dict() if resume_sizes is None else resume_sizes
+        self.writers = dict()
+        for bucket in range(sr_buckets_amount):
+            bucket_file_path = self._bucket_file_path(bucket)
+            if bucket_file_path + '.' + output_format in self.resume_sizes:
+                self._open_bucket_writer(bucket)
+
+    def _bucket_file_path(self, bucket):
+        return os.path.join(self.saving_path, bucket_dir_name(bucket), self.file_name)
+
+    def _open_bucket_writer(self, bucket):
+        os.makedirs(os.path.join(self.saving_path, bucket_dir_name(bucket)), exist_ok=True)
+        self.writers[bucket] = open_chunk_writer(file_path=self._bucket_file_path(bucket), columns=self.columns,
+                                                 output_format=self.output_format, resume_sizes=self.resume_sizes)
+
+    def write_rows(self, rows):
+        rows_per_bucket = dict()
+        for r in rows:
+            rows_per_bucket.setdefault(sr_bucket(r['subreddit'], self.sr_buckets_amount), []).append(r)
+        for bucket, bucket_rows in rows_per_bucket.items():
+            if bucket not in self.writers:
+                self._open_bucket_writer(bucket)
+            self.writers[bucket].write_rows(bucket_rows)
+
+    def checkpoint(self):
+        sizes = dict()
+        for writer in self.writers.values():
+            cur_sizes = writer.checkpoint()
+            if cur_sizes is None:
+                return None
+            sizes.update(cur_sizes)
+        return sizes
+
+    def finalize(self):
+        return [f for writer in self.writers.values() for f in writer.finalize()]
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def sr_bucket(sr_name, sr_buckets_amount):
+    """
+    the hash bucket of a subreddit. The hash is based on the lower-cased name, and it is stable between runs and
+    machines (unlike python's own hash function)
+    :param sr_name: str or None
+        name of the subreddit
+    :param sr_buckets_amount: int
+        amount of buckets in use
+    :return: int
+    """
+    return zlib.crc32(str(sr_name).lower().encode('UTF-8')) % sr_buckets_amount
+
+
+def bucket_dir_name(bucket):
+    return 'sr_bucket={:04d}'.format(bucket)
+
+
+def save_partitioning_info(saving_path, sr_buckets_amount):
+    """
+    saving the partitioning info into the folder of the monthly files, so readers will know how to find the files
+    of each subreddit
+    """
+    with open(os.path.join(saving_path, partitioning_file_name), 'w') as f:
+        json.dump({'sr_buckets_amount': sr_buckets_amount}, f)
+
+
+def load_partitioning_info(files_path):
+    """
+    loading the partitioning info saved by the 'save_partitioning_info' function
+    :return: dict or None
+        None in case the files in the folder are not partitioned
+    """
+    info_file = os.path.join(files_path, partitioning_file_name)
+    if not os.path.isfile(info_file):
+        return None
+    with open(info_file) as f:
+        return json.load(f)
+
+
+def file_fingerprint(file_path, sample_size=2**20):
+    """
+    a cheap fingerprint of a (huge) file: its size, modification time and a sha1 hash of its first and last
+    'sample_size' bytes. Hashing the full file would take as long as reading it
+    :param file_path: str
+        full path of the file
+    :param sample_size: int, default: 2**20 (1MB)
+        amount of bytes to hash from each side of the file
+    :return: dict
+        with the 'size', 'mtime' and 'hash' keys
+    """
+    file_stat = os.stat(file_path)
+    sha1 = hashlib.sha1(str(file_stat.st_size).encode('UTF-8'))
+    with open(file_path, 'rb') as f:
+        sha1.update(f.read(sample_size))
+        f.seek(max(file_stat.st_size - sample_size, 0))
+        sha1.update(f.read(sample_size))
+    return {'size': file_stat.st_size, 'mtime': file_stat.st_mtime, 'hash': sha1.hexdigest()}
+
+
+def load_manifest_entry(saving_path, file_name):
+    """
+    loading the manifest entry of a single input file, as saved by 'save_manifest_entry'. Each input file has its own
+    entry file under '<saving_path>/_manifest/', so parallel workers never write into the same file
+    :return: dict or None
+        None in case the file was never handled
+    """
+    entry_file = os.path.join(saving_path, manifest_dir_name, file_name + '.json')
+    if not os.path.isfile(entry_file):
+        return None
+    with open(entry_file) as f:
+        return json.load(f)
+
+
+def save_manifest_entry(saving_path, file_name, entry):
+    """
+    saving (atomically) the manifest entry of a single input file
+    :param saving_path: str
+        location of the output files, the manifest is saved under its '_manifest' folder
+    :param file_name: str
+        name of the input file (e.g., 'RC_2017-04.bz2')
+    :param entry: dict
+        the entry to save. It holds the input file fingerprint (see 'file_fingerprint'), the 'status' ('in_progress'
+        or 'done'), the 'lines_consumed', 'bytes_consumed' (of the decompressed data) and 'rows_emitted' up to the
+        last checkpoint and the 'outputs' (final file path -> committed size of its temporary file)
+    :return: None
+    """
+    manifest_dir = os.path.join(saving_path, manifest_dir_name)
+    os.makedirs(manifest_dir, exist_ok=True)
+    entry_file = os.path.join(manifest_dir, file_name + '.json')
+    with open(entry_file + '.tmp', 'w') as f:
+        json.dump(entry, f)
+    os.replace(entry_file + '.tmp', entry_file)
+
+
+def arrow_schema(columns):
+    """
+    the parquet schema of the Pushshift columns: integers are int64, 'created_utc_as_date' is a timestamp (an int64
+    epoch in seconds under the hood), 'subreddit' is a dictionary encoded (categorical) string and all the rest are
+    strings
+    :param columns: list
+        columns to be included in the schema, in this order
+    :return: pyarrow.Schema
+    """
+    fields = []
+    for col in columns:
+        if col in int_columns:
+            fields.append(pa.field(col, pa.int64()))
+        elif col in category_columns:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col in timestamp_columns:
+            fields.append(pa.field(col, pa.timestamp('s')))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def csv_dtypes(columns=None):
+    """
+    the pandas dtypes of the Pushshift columns, used while reading csv files (the same schema as in 'arrow_schema').
+    Integers are nullable 'Int64' (values might be missing in old dumps), 'subreddit' is categorical and all the rest
+    (including 'created_utc_as_date', which is compared as a 'YYYY-MM-DD HH:MM:SS' string) are strings
+    :param columns: list or None, default: None
+        columns to be included. If None - all known columns (int and categorical ones) are returned and any other
+        column is read as a string
+    :return: dict or collections.defaultdict
+        mapping of a column name to its dtype, to be passed as the 'dtype' of 'pd.read_csv'
+    """
+    if columns is None:
+        dtypes = collections.defaultdict(lambda: str)
+        columns = int_columns | category_columns
+    else:
+        dtypes = dict()
+    for col in columns:
+        if col in int_columns:
+            dtypes[col] = 'Int64'
+        elif col in category_columns:
+            dtypes[col] = 'category'
+        else:
+            dtypes[col] = str
+    return dtypes
+
+
+def concat_monthly_frames(dfs):
+    """
+    concatenating data-frames which were read out of the monthly files. Categorical columns (e.g., 'subreddit') are
+    kept categorical, even though each data-frame holds a different set of categories (pandas falls back to object
+    dtype in such case)
+    :param dfs: list
+        list of pandas data-frames, with the same columns
+    :return: pandas data-frame
+    """
+    full_df = pd.concat(dfs)
+    for col in category_columns:
+        if col in full_df.columns and full_df[col].dtype != 'category':
+            full_df[col] = full_df[col].astype('category')
+    return full_df
+
+
+def _to_arrow_array(values, arrow_type):
+    if pa.types.is_int64(arrow_type):
+        # some of the old dumps hold numbers as strings (e.g., '12' or '1491004800.0')
+        return pa.array([_to_int(v) for v in values], type=arrow_type)
+    if pa.types.is_timestamp(arrow_type):
+        return pa.array(values, type=pa.string()).cast(arrow_type)
+    # non textual values (e.g., 'media' which is a dictionary) are saved the same way the csv writer saves them
+    values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    if pa.types.is_dictionary(arrow_type):
+        return pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.array(values, type=arrow_type)
+
+
+def _to_int(value):
+    # values which are not numbers are saved as missing ones (the csv writer saves them as is)
+    if value is None or type(value) is int:
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+
+def list_monthly_files(files_path, prefix, start_month=None, end_month=None, srs_to_include=None):
+    """
+    finding the monthly files (e.g., RS_2017-01.csv or RC_2017-01.parquet) created by the 'general_loader' function.
+    In case a month exists both as csv and as parquet, the parquet one is taken. In case the files are partitioned
+    by subreddit (see 'save_partitioning_info'), only the buckets of the 'srs_to_include' are returned
+    :param files_path: str
+        location of the files
+    :param prefix: str
+        either 'RS' (submissions) or 'RC' (comments)
+    :param start_month: str or None, default: None
+        the starting month in YYYY-MM format. If None - no lower limit is used
+    :param end_month: str or None, default: None
+        the ending month in YYYY-MM format. If None - no upper limit is used
+    :param srs_to_include: list or None, default: None
+        subreddits (lower-cased) whose files are needed. Relevant only for partitioned folders. If None - all buckets
+        are returned
+    :return: list
+        sorted (by month) list of file names. In partitioned folders, these are paths relative to the 'files_path'
+    """
+    partitioning_info = load_partitioning_info(files_path)
+    if partitioning_info is None:
+        return _list_monthly_files_in_dir(files_path=files_path, prefix=prefix, start_month=start_month,
+                                          end_month=end_month)
+    sr_buckets_amount = partitioning_info['sr_buckets_amount']
+    if srs_to_include is None:
+        buckets = range(sr_buckets_amount)
+    else:
+        buckets = sorted({sr_bucket(sr_name, sr_buckets_amount) for sr_name in srs_to_include})
+    files_found = []
+    for bucket in buckets:
+        bucket_dir = bucket_dir_name(bucket)
+        if not os.path.isdir(os.path.join(files_path, bucket_dir)):
+            continue
+        files_found += [os.path.join(bucket_dir, f) for f in
+                        _list_monthly_files_in_dir(files_path=os.path.join(files_path, bucket_dir), prefix=prefix,
+                                                   start_month=start_month, end_month=end_month)]
+    # sorting by the month (the bucket is only a second key)
+    return sorted(files_found, key=lambda f: (os.path.basename(f), f))
+
+
+def _list_monthly_files_in_dir(files_path, prefix, start_month, end_month):
+    files_per_month = dict()
+    for f in os.listdir(files_path):
+        match = re.match(monthly_file_regex, f)
+        if match is None or match.group(1) != prefix:
+            continue
+        cur_month = match.group(2)
+        if (start_month is not None and cur_month < start_month) or (end_month is not None and cur_month > end_month):
+            continue
+        if cur_month not in files_per_month or match.group(3) == 'parquet':
+            files_per_month[cur_month] = f
+    return [files_per_month[m] for m in sorted(files_per_month)]
+
+
+def read_monthly_file(file_path, columns=None, encoding='utf-8'):
+    """
+    reading a single monthly file (csv or parquet) into a data-frame
+    :param file_path: str
+        full path of the file
+    :param columns: list or None, default: None
+        columns to be loaded. If None - all columns are loaded. Other columns are not even parsed (csv) or read
+        (parquet)
+    :param encoding: str, default: 'utf-8'
+        encoding of the file (relevant only to csv files)
+    :return: pandas data-frame
+        columns types are according to 'csv_dtypes' (csv files) or 'arrow_schema' (parquet files)
+    """
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow must be installed in order to read parquet files")
+        return pq.read_table(file_path, columns=columns).to_pandas()
+    return pd.read_csv(filepath_or_buffer=file_path, encoding=encoding, usecols=columns, dtype=csv_dtypes(columns))
+
+
+def iter_monthly_file_chunks(file_path, columns=None, encoding='utf-8', chunk_size=None):
+    """
+    reading a single monthly file (csv or parquet) in chunks, so only a single chunk is held in memory at a time
+    :param file_path: str
+        full path of the file
+    :param columns: list or None, default: None
+        columns to be loaded. If None - all columns are loaded
+    :param encoding: str, default: 'utf-8'
+        encoding of the file (relevant only to csv files)
+    :param chunk_size: int or None, default: None
+        amount of rows in each chunk. If None - 'csv_read_chunk_size' is used
+    :return: generator
+        yields pandas data-frames, with the same types as 'read_monthly_file' returns
+    """
+    chunk_size = csv_read_chunk_size if chunk_size is None else chunk_size
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow must be installed in order to read parquet files")
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    with pd.read_csv(filepath_or_buffer=file_path, encoding=encoding, usecols=columns, dtype=csv_dtypes(columns),
+                     chunksize=chunk_size) as reader:
+        for cur_chunk in reader:
+            yield cur_chunk
+
+
+def iter_json_lines_chunks(file_path, columns, srs_to_include=None, chunk_size=None, backend='auto'):
+    """
+    reading a json lines file (a submission/comment per line, either plain or zipped as the Pushshift dumps) in
+    chunks, so only the relevant rows of a single chunk are held in memory at a time. Only the required columns are
+    decoded out of each line (see 'make_line_decoder') and lines of other subreddits are dropped before being parsed
+    (see 'make_sr_prefilter')
+    :param file_path: str
+        full path of the file. Files ending with .bz2, .xz or .zst are decompressed on the fly
+    :param columns: list
+        keys to pull out of each json line. Must include 'subreddit' in case 'srs_to_include' is given
+    :param srs_to_include: list, set or None, default: None
+        subreddit names (case insensitive) to keep. If None - all lines are kept
+    :param chunk_size: int or None, default: None
+        amount of lines to decode in each chunk. If None - 'json_read_chunk_size' is used
+    :param backend: str, default: 'auto'
+        json parser to use (see 'make_line_decoder')
+    :return: generator
+        yields pandas data-frames with the given columns (chunks with no relevant rows are skipped)
+    """
+    chunk_size = json_read_chunk_size if chunk_size is None else chunk_size
+    decode_line = make_line_decoder(keys=columns, backend=backend)
+    keep_line = make_sr_prefilter(srs_to_include) if srs_to_include is not None else None
+    srs_to_include = None if srs_to_include is None else {str(sr_name).lower() for sr_name in srs_to_include}
+    lines_reader = open_zipped_file(file_path) if file_path.endswith(('.bz2', '.xz', '.zst')) \
+        else _LinesReader(open(file_path, 'rb'))
+    with lines_reader as f:
+        rows = []
+        for line in f:
+            if line.strip() and (keep_line is None or keep_line(line)):
+                rows.append(decode_line(line))
+            if len(rows) >= chunk_size:
+                yield from _json_rows_to_frame(rows, columns, srs_to_include)
+                rows = []
+        if rows:
+            yield from _json_rows_to_frame(rows, columns, srs_to_include)
+
+
+def read_json_lines(file_path, columns, srs_to_include=None, chunk_size=None, backend='auto'):
+    """
+    reading a json lines file into a single data-frame, chunk by chunk (see 'iter_json_lines_chunks'). The peak
+    memory is the size of the relevant rows, rather than the size of the full file
+    :return: pandas data-frame
+        with the given columns and a default (range) index
+    """
+    dfs = list(iter_json_lines_chunks(file_path=file_path, columns=columns, srs_to_include=srs_to_include,
+                                      chunk_size=chunk_size, backend=backend))
+    if not dfs:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def _json_rows_to_frame(rows, columns, srs_to_include):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    # the pre-filter lets through lines it cannot decide on, hence the subreddits are checked again after parsing
+    if srs_to_include is not None:
+        df = df[df['subreddit'].str.lower().isin(srs_to_include)]
+    if len(df):
+        yield df
+
+
+def read_monthly_subset(file_path, srs_to_include=None, min_utc=None, max_utc=None, columns=None, encoding='utf-8'):
+    """
+    reading the rows of specific subreddits and time window out of a single monthly file (csv or parquet). The
+    filters are applied while the file is scanned, so the full file is never held in memory: csv files are parsed in
+    chunks of 'csv_read_chunk_size' rows, each filtered right away. In parquet files, row groups out of the time
+    window are not even read (based on their min/max statistics) and the rest are filtered before converting them
+    into pandas
+    :param file_path: str
+        full path of the file
+    :param srs_to_include: list or set or None, default: None
+        lower-cased SR names to be included. If None - all subreddits are included
+    :param min_utc: str or None, default: None
+        the minimum 'created_utc_as_date' to include ('YYYY-MM-DD HH:MM:SS' format). If None - no minimum is used
+    :param max_utc: str or None, default: None
+        the maximum 'created_utc_as_date' to include ('YYYY-MM-DD HH:MM:SS' format). If None - no maximum is used
+    :param columns: list or None, default: None
+        columns to be returned. If None - all columns are returned. The filtering columns ('subreddit' and
+        'created_utc_as_date') are read anyway, but are returned only if they are part of 'columns'
+    :param encoding: str, default: 'utf-8'
+        encoding of the file (relevant only to csv files)
+    :return: pandas data-frame
+        the same data-frame as reading the full file and filtering it. Rows without a date are never included
+    """
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow must be installed in order to read parquet files")
+        date_filter = pc.is_valid(pc.field('created_utc_as_date'))
+        if min_utc is not None:
+            date_filter = date_filter & (pc.field('created_utc_as_date') >=
+                                         pa.scalar(pd.Timestamp(min_utc), type=pa.timestamp('s')))
+        if max_utc is not None:
+            date_filter = date_filter & (pc.field('created_utc_as_date') <=
+                                         pa.scalar(pd.Timestamp(max_utc), type=pa.timestamp('s')))
+        if srs_to_include is not None:
+            date_filter = date_filter & pc.is_in(pc.utf8_lower(pc.field('subreddit').cast(pa.string())),
+                                                 value_set=pa.array(list(srs_to_include), type=pa.string()))
+        return pq.read_table(file_path, columns=columns, filters=date_filter).to_pandas()
+
+    usecols = None if columns is None else list(dict.fromkeys(columns + ['subreddit', 'created_utc_as_date']))
+    filtered_chunks = []
+    for cur_chunk in pd.read_csv(filepath_or_buffer=file_path, encoding=encoding, usecols=usecols,
+                                 dtype=csv_dtypes(usecols), chunksize=csv_read_chunk_size):
+        if srs_to_include is not None:
+            cur_chunk = cur_chunk[cur_chunk["subreddit"].str.lower().isin(srs_to_include)]
+        dates = cur_chunk['created_utc_as_date']
+        mask = dates.notna()
+        if min_utc is not None:
+            mask &= dates >= min_utc
+        if max_utc is not None:
+            mask &= dates <= max_utc
+        filtered_chunks.append(cur_chunk[mask] if columns is None else cur_chunk.loc[mask, columns])
+    return concat_monthly_frames(filtered_chunks)
+
+
+def read_monthly_subsets(files_path, file_names, workers_amount=None, **subset_kwargs):
+    """
+    reading a subset (see 'read_monthly_subset') out of a few monthly files at the same time. Threads are used (and
+    not processes) since most of the work (csv parsing, parquet decoding and decompression) is done outside of the
+    GIL, and since the callers might already run inside a worker process of a multiprocessing pool
+    :param files_path: str
+        location of the files
+    :param file_names: list
+        names of the files to read (as returned by 'list_monthly_files')
+    :param workers_amount: int or None, default: None
+        amount of files to read at the same time. If None - min(files amount, cpu count, 'max_read_workers') is
+        used. If 1 - files are read one after the other in the calling thread
+    :param subset_kwargs: dict
+        any other parameter of 'read_monthly_subset' (e.g., 'srs_to_include', 'max_utc', 'columns', 'encoding')
+    :return: list
+        list of pandas data-frames, in the same order as 'file_names' (regardless of the order reading has ended)
+    """
+    if workers_amount is None:
+        workers_amount = min(len(file_names), os.cpu_count() or 1, max_read_workers)
+
+    def _read_one(file_name):
+        return read_monthly_subset(file_path=os.path.join(files_path, file_name), **subset_kwargs)
+
+    if workers_amount <= 1:
+        return [_read_one(file_name) for file_name in file_names]
+    with ThreadPoolExecutor(max_workers=workers_amount) as executor:
+        return list(executor.map(_read_one, file_names))
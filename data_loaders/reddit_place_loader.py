@@ -6,90 +6,203 @@ import pandas as pd
 import re
 import sys
 import numpy as np
+from data_loaders.pushshift_io import read_json_lines
+try:
+    import ahocorasick
+except ImportError:  # the pyahocorasick package is needed only for long lists of indicator words
+    ahocorasick = None
 
 ###################################################### Configurations ##################################################
 data_path = ''# NEED TO SET UP YOUR LOCAL DATA PATH
 use_comments_data = True
 test_data_logic = None   # either 'atlas_based' or 'submission_based' or None
+indicator_words = ['r/place', '@Place', 'canvas', 'pixel', 'flag', '/r/place']
+aho_corasick_min_words = 50   # 'auto' keyword matching uses Aho-Corasick (if installed) from this amount of words
+expansion_max_hops = None   # None - expanding the relevant items until no new rows are added
+expansion_follow_replies = True
+output_path = ''# NEED TO SET UP YOUR LOCAL OUTPUT FILE (.h5), the submissions and comments are saved as two keys in it
+hdf_compression = {'complib': 'blosc:zstd', 'complevel': 9}
 ########################################################################################################################
 
-if __name__ == "__main__":
-    # reading the data again from the data location source
-    submission_data = pd.read_json(data_path + 'RS_31-3_to_4-4_2017.txt', lines=True)
-    comments_data = pd.read_json(data_path + 'RC_31-3_to_4-4_2017.txt', lines=True)
 
+def keywords_mask(texts, keywords=None, method='auto'):
+    """
+    finding which of the texts contain (case insensitive) at least one of the keywords
+    :param texts: pandas Series
+        the texts to search in. Missing values (e.g., NaN selftext) and non textual columns are never a match
+    :param keywords: list or None, default: None
+        words/phrases to look for (as is, not as regexes). If None - the 'indicator_words' are used
+    :param method: str, default: 'auto'
+        'regex' - a single precompiled pattern of all keywords, applied with the vectorized 'str.contains'.
+        'aho_corasick' - an Aho-Corasick automaton (the pyahocorasick package), which scans each text once no matter
+        how many keywords there are. 'auto' - Aho-Corasick for 'aho_corasick_min_words' keywords or more (if it is
+        installed), regex otherwise
+    :return: pandas Series
+        boolean mask, with the same index as 'texts'
+
+    Example
+    -------
+    >>> keywords_mask(texts=pd.Series(['Our PIXEL art', None, 'nothing here']))
+    0     True
+    1    False
+    2    False
+    dtype: bool
+    """
+    keywords = indicator_words if keywords is None else keywords
+    # an all missing column (e.g., an empty selftext read out of a csv) is float typed, it cannot hold any text
+    if not (pd.api.types.is_object_dtype(texts) or pd.api.types.is_string_dtype(texts)):
+        return pd.Series(False, index=texts.index)
+    if method == 'auto':
+        method = 'aho_corasick' if ahocorasick is not None and len(keywords) >= aho_corasick_min_words else 'regex'
+    if method == 'regex':
+        pattern = re.compile('|'.join(re.escape(k) for k in keywords), re.IGNORECASE)
+        return texts.str.contains(pattern, na=False).astype(bool)
+    if method != 'aho_corasick':
+        raise IOError("keywords matching method must be either 'auto', 'regex' or 'aho_corasick'. Fix and try again")
+    if ahocorasick is None:
+        raise ImportError("pyahocorasick must be installed in order to use the 'aho_corasick' method")
+    automaton = ahocorasick.Automaton()
+    for k in keywords:
+        automaton.add_word(k.lower(), k)
+    automaton.make_automaton()
+    lower_texts = texts.str.lower()
+    is_valid = lower_texts.notna().to_numpy()
+    mask = np.zeros(len(texts), dtype=bool)
+    mask[is_valid] = [next(automaton.iter(t), None) is not None for t in lower_texts[is_valid]]
+    return pd.Series(mask, index=texts.index)
+
+
+def submissions_keywords_mask(submissions_df, keywords=None, method='auto'):
+    """
+    finding the submissions which contain one of the keywords in their title or selftext (see 'keywords_mask')
+    :return: pandas Series
+        boolean mask, with the same index as 'submissions_df'
+    """
+    return keywords_mask(texts=submissions_df['title'], keywords=keywords, method=method) | \
+        keywords_mask(texts=submissions_df['selftext'], keywords=keywords, method=method)
+
+
+def comments_keywords_mask(comments_df, keywords=None, method='auto'):
+    """
+    finding the comments which contain one of the keywords in their body (see 'keywords_mask')
+    :return: pandas Series
+        boolean mask, with the same index as 'comments_df'
+    """
+    return keywords_mask(texts=comments_df['body'], keywords=keywords, method=method)
+
+
+class ThreadExpander(object):
+    """
+    graph-style expansion of the relevant (e.g., r/place related) submissions and comments. Items are linked in two
+    ways: by the comments 'link_id' (a thread - the submission and all comments written under it) and by the comments
+    'parent_id' (a comment and the replies to it). All ids are mapped once into integer codes, so each hop is a
+    vectorized (hash based) join of the items added in the previous hop only, instead of a rescan of the full frames
+
+    :param submissions_df: pandas data-frame
+        submissions data, must include an 'id' column (without the 't3_' prefix)
+    :param comments_df: pandas data-frame
+        comments data, must include the 'id' (without the 't1_' prefix), 'link_id' and 'parent_id' columns
+    """
+    def __init__(self, submissions_df, comments_df):
+        self.submissions_index = submissions_df.index
+        self.comments_index = comments_df.index
+        all_ids = pd.concat([('t3_' + submissions_df['id'].astype(str)).reset_index(drop=True),
+                             ('t1_' + comments_df['id'].astype(str)).reset_index(drop=True),
+                             comments_df['link_id'].reset_index(drop=True),
+                             comments_df['parent_id'].reset_index(drop=True)], ignore_index=True)
+        codes, uniques = pd.factorize(all_ids)
+        # missing ids (code -1) are all mapped to an extra code, which is never marked as relevant
+        self.nodes_amount = len(uniques) + 1
+        codes[codes == -1] = len(uniques)
+        submissions_amount, comments_amount = len(submissions_df), len(comments_df)
+        self.submission_codes = codes[:submissions_amount]
+        self.comment_codes, self.link_codes, self.parent_codes = \
+            np.split(codes[submissions_amount:], [comments_amount, 2 * comments_amount])
+
+    def expand(self, submissions_mask, comments_mask, max_hops=None, follow_replies=True):
+        """
+        expanding the relevant items until no new rows are added (a fixed point) or up to a given amount of hops.
+        In each hop, every thread with a relevant item becomes fully relevant (its submission and all its comments)
+        and, if 'follow_replies' is True, so are the replies to relevant comments
+        :param submissions_mask: boolean array-like
+            the submissions to start from (e.g., the ones containing r/place keywords)
+        :param comments_mask: boolean array-like
+            the comments to start from
+        :param max_hops: int or None, default: None
+            maximum amount of hops to do. If None - expanding until no new rows are added
+        :param follow_replies: bool, default: True
+            whether replies to relevant comments should become relevant as well. Relevant only for comments which
+            their submission is not part of the submissions data, since otherwise the full thread is relevant anyway
+        :return: tuple
+            the submissions mask (pandas Series), the comments mask (pandas Series) and a data-frame with the amount
+            of rows each hop added (hop 0 is the starting point)
+        """
+        relevant_submissions = np.asarray(submissions_mask, dtype=bool).copy()
+        relevant_comments = np.asarray(comments_mask, dtype=bool).copy()
+        new_submissions, new_comments = relevant_submissions.copy(), relevant_comments.copy()
+        relevant_threads = np.zeros(self.nodes_amount, dtype=bool)
+        hops = [{'hop': 0, 'submissions_added': int(new_submissions.sum()), 'comments_added': int(new_comments.sum())}]
+        while (new_submissions.any() or new_comments.any()) and (max_hops is None or len(hops) <= max_hops):
+            # threads touched by the items added in the previous hop, which were not expanded yet
+            new_threads = self._mark(np.concatenate([self.submission_codes[new_submissions],
+                                                     self.link_codes[new_comments]]))
+            new_threads &= ~relevant_threads
+            relevant_threads |= new_threads
+            added_submissions = new_threads[self.submission_codes] & ~relevant_submissions
+            added_comments = new_threads[self.link_codes]
+            if follow_replies:
+                added_comments |= self._mark(self.comment_codes[new_comments])[self.parent_codes]
+            added_comments &= ~relevant_comments
+            relevant_submissions |= added_submissions
+            relevant_comments |= added_comments
+            new_submissions, new_comments = added_submissions, added_comments
+            hops.append({'hop': len(hops), 'submissions_added': int(new_submissions.sum()),
+                         'comments_added': int(new_comments.sum())})
+        return pd.Series(relevant_submissions, index=self.submissions_index), \
+            pd.Series(relevant_comments, index=self.comments_index), pd.DataFrame(hops).set_index('hop')
+
+    def _mark(self, codes):
+        is_marked = np.zeros(self.nodes_amount, dtype=bool)
+        is_marked[codes] = True
+        is_marked[-1] = False
+        return is_marked
+
+
+if __name__ == "__main__":
+    if not output_path:
+        raise IOError("'output_path' must be set in order to save the results. Fix and try again")
     # loading the subreddits data (now it is a df, we'll take a single column)
     subreddits_df = pd.read_csv(data_path + 'all_subreddits_revealed.csv')
     subreddits_list = list(subreddits_df['sr'])
-    # adding explicit timestamp to the data
-    submission_data = submission_data.assign(created_utc_as_date=pd.to_datetime(submission_data['created_utc'],
-                                                                                unit='s'))
-    comments_data = comments_data.assign(created_utc_as_date=pd.to_datetime(comments_data['created_utc'], unit='s'))
-    # sort the subreddit data by time
-    submission_data.sort_values(by='created_utc_as_date', ascending=True, inplace=True)
-    comments_data.sort_values(by='created_utc_as_date', ascending=True, inplace=True)
 
-    # filter the data again, now taking only few specific intresting columns from each dataset
-    submissions_interesting_col = ["created_utc_as_date", "author", "subreddit", "title", "selftext", "num_comments",
+    # reading the data (in chunks) from the data location source, taking only few specific intresting columns from
+    # each dataset and only comments and submissions taken from the list of relevant subreddits (~2300 srs)
+    submissions_interesting_col = ["created_utc", "author", "subreddit", "title", "selftext", "num_comments",
                                    "view_count", "permalink", "score", "id"]
-    submissions_shrinked = submission_data[submissions_interesting_col]
-    comments_interesting_col = ["created_utc_as_date", "author", "subreddit", "body", "score", "id",
-                                "link_id", "parent_id"]
-    comments_shrinked = comments_data[comments_interesting_col]
-
-    # creating a subset which is only comments and submissions taken from the list of relevant subreddits (~2300 srs)
-    submissions_subset = submissions_shrinked[submissions_shrinked['subreddit'].str.lower().isin(subreddits_list)]
-    comments_subset = comments_shrinked[comments_shrinked['subreddit'].str.lower().isin(subreddits_list)]
+    comments_interesting_col = ["created_utc", "author", "subreddit", "body", "score", "id", "link_id", "parent_id"]
+    submissions_subset = read_json_lines(file_path=data_path + 'RS_31-3_to_4-4_2017.txt',
+                                         columns=submissions_interesting_col, srs_to_include=subreddits_list)
+    comments_subset = read_json_lines(file_path=data_path + 'RC_31-3_to_4-4_2017.txt',
+                                      columns=comments_interesting_col, srs_to_include=subreddits_list)
+    # adding explicit timestamp to the data (instead of the epoch one)
+    for cur_subset in [submissions_subset, comments_subset]:
+        cur_subset.insert(0, 'created_utc_as_date', pd.to_datetime(cur_subset.pop('created_utc'), unit='s'))
+    # sort the subreddit data by time
+    submissions_subset.sort_values(by='created_utc_as_date', ascending=True, inplace=True)
+    comments_subset.sort_values(by='created_utc_as_date', ascending=True, inplace=True)
     print("Current submission data dimension is {}. "
-          "Current comments data dimension is {}".format(submissions_shrinked.shape, comments_subset.shape))
-
-    # now doing 2 cycles on the data (submissions and comments) to filter out only rows directly related to r/place
-    # First cycle - submissions data
-    indicator_words = ['r/place', '@Place', 'canvas', 'pixel', 'flag', '/r/place']
-    regex = '|'.join(indicator_words)
-    relevant_submissions_idx = set()
-    for index, row in submissions_subset.iterrows():
-        cur_title = row['title']
-        cur_selftext = row['selftext']
-        title_res = re.search(regex, cur_title, re.IGNORECASE)
-        selftext_res = re.search(regex, cur_selftext, re.IGNORECASE)
-        if title_res is not None or selftext_res is not None:
-            relevant_submissions_idx.add(index)
-    relevant_submissions_ids = {"t3_"+id for id in submissions_shrinked.loc[relevant_submissions_idx]["id"]}
-
-    # First cycle - comments data
-    relevant_comments_idx = set()
-    for index, row in comments_subset.iterrows():
-        cur_body = row['body']
-        cur_linkid = row['link_id']
-        body_res = re.search(regex, cur_body, re.IGNORECASE)
-        if body_res is not None or cur_linkid in relevant_submissions_ids:
-            relevant_comments_idx.add(index)
-    print("Currently we have {} rows in the submissions data and {} "
-          "rows in the comments data".format(len(relevant_submissions_idx), len(relevant_comments_idx)))
-
-    # Second cycle - submissions data. Adding items based on comments we found
-    comments_temp_subset = comments_subset.loc[relevant_comments_idx]
-    comments_temp_linkid = comments_temp_subset["link_id"]
-    comments_temp_linkid_list = [l[3:] for l in comments_temp_linkid]
-    submissions_temp_subset = submissions_subset[submissions_subset['id'].isin(comments_temp_linkid_list)]
-    index_to_add = set(submissions_temp_subset.index.values)
-    ids_to_add = set(['t3_'+i for i in submissions_temp_subset['id']])
-    relevant_submissions_idx.update(index_to_add)
-    relevant_submissions_ids.update(ids_to_add)
-
-    comments_temp_subset = comments_subset[comments_subset['link_id'].isin(list(relevant_submissions_ids))]
-    index_to_add = set(comments_temp_subset.index.values)
-    relevant_comments_idx.update(index_to_add)
+          "Current comments data dimension is {}".format(submissions_subset.shape, comments_subset.shape))
 
+    # expanding the rows directly related to r/place (keywords based) to the full threads they are part of
+    expander = ThreadExpander(submissions_df=submissions_subset, comments_df=comments_subset)
+    submissions_mask, comments_mask, hops_report = \
+        expander.expand(submissions_mask=submissions_keywords_mask(submissions_df=submissions_subset),
+                        comments_mask=comments_keywords_mask(comments_df=comments_subset),
+                        max_hops=expansion_max_hops, follow_replies=expansion_follow_replies)
+    print("Rows added in each hop of the expansion:\n{}".format(hops_report))
     print("Currently we have {} rows in the submissions data and {} "
-          "rows in the comments data".format(len(relevant_submissions_idx), len(relevant_comments_idx)))
-
-    # saving the objects as hdf files
-    submissions_to_save = submissions_subset.loc[relevant_submissions_idx].copy()
-    comments_to_save = comments_subset.loc[relevant_comments_idx].copy()
-    # in the next 2 lines - set the exact location for savinf the file
-	submissions_to_save.to_hdf(path_or_buf='',
-                               key='submission_shrinked')
-    comments_to_save.to_hdf(path_or_buf='',
-                            key='comments_shrinked')
\ No newline at end of file
+          "rows in the comments data".format(submissions_mask.sum(), comments_mask.sum()))
+
+    # saving the objects as (compressed) hdf files
+    submissions_subset[submissions_mask].to_hdf(path_or_buf=output_path, key='submission_shrinked', **hdf_compression)
+    comments_subset[comments_mask].to_hdf(path_or_buf=output_path, key='comments_shrinked', **hdf_compression)
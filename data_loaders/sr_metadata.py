@@ -0,0 +1,132 @@
+# Authors: Abraham Israeli
+# Python version: 3.7
+# Last update: 26.01.2021
+
+import os
+import pickle
+import pandas as pd
+from data_loaders.pushshift_io import make_line_decoder
+
+###################################################### Configurations ##################################################
+cache_dir_name = '_sr_metadata_cache'   # sub folder (of the source file folder) holding the cached tables
+########################################################################################################################
+
+
+def load_srs_meta_data(file_path, cache_dir=None):
+    """
+    loading the SRs meta-data we crawled (see 'crawl_srs_metadata.py'), a json file with a line per SR. An SR might
+    appear in a few lines, then the max amount of subscribers and the last 'created' value are taken. SRs without any
+    subscribers amount are removed. The table is built once and cached (see '_load_with_cache'), later calls only read
+    the cache
+    :param file_path: str
+        full path of the json file (e.g., <data_path>/srs_meta_data_102016_to_032017.json)
+    :param cache_dir: str or None, default: None
+        location of the cached table. If None - a '_sr_metadata_cache' folder next to the json file is used
+    :return: pandas data-frame
+        index is the lower-cased SR name, columns are 'subreddit_name' (lower-cased as well), 'number_of_subscribers',
+        'creation_epoch' and 'created_utc_as_date'. SRs are ordered by their first appearance in the file
+    """
+    return _load_with_cache(source_path=file_path, build_func=_build_srs_meta_data, cache_dir=cache_dir)
+
+
+def load_place_related_srs(file_path, sheet_name='Detailed list', cache_dir=None):
+    """
+    loading the excel file we created, including only SRs related in some way to the r/place experiment. Reading
+    excel files is very slow, so the sheet is cached (see '_load_with_cache') and later calls only read the cache
+    :param file_path: str
+        full path of the excel file (e.g., all_subredditts_based_atlas_and_submissions.xlsx)
+    :param sheet_name: str, default: 'Detailed list'
+        the sheet to load
+    :param cache_dir: str or None, default: None
+        location of the cached table. If None - a '_sr_metadata_cache' folder next to the excel file is used
+    :return: pandas data-frame
+        the sheet as is (same columns as 'pd.read_excel' returns), with the lower-cased 'SR' value as index
+    """
+    def _build_place_related_srs(source_path):
+        place_related_srs = pd.read_excel(io=source_path, sheet_name=sheet_name)
+        place_related_srs.index = pd.Index([str(name).lower() for name in place_related_srs['SR']], name='sr_name')
+        return place_related_srs
+
+    return _load_with_cache(source_path=file_path, build_func=_build_place_related_srs, cache_dir=cache_dir,
+                            cache_name_suffix=sheet_name)
+
+
+def lookup_srs(sr_table, sr_names):
+    """
+    pulling out the rows of specific SRs out of a table returned by 'load_srs_meta_data' or 'load_place_related_srs'
+    :param sr_table: pandas data-frame
+        table indexed by lower-cased SR names
+    :param sr_names: iterable
+        SR names to look for (any case). Names which do not exist in the table are ignored
+    :return: pandas data-frame
+        rows of the SRs found, in the order of the table
+    """
+    return sr_table[sr_table.index.isin({str(name).lower() for name in sr_names})]
+
+
+def _build_srs_meta_data(source_path):
+    decode_line = make_line_decoder(keys=['display_name', 'subscribers', 'created'])
+    names, subscribers, created = [], [], []
+    with open(source_path, 'rb') as f:
+        for line in f:
+            cur_line = decode_line(line)
+            names.append(str(cur_line['display_name']).lower())
+            subscribers.append(cur_line['subscribers'])
+            created.append(cur_line['created'])
+    meta_data = pd.DataFrame({'subreddit_name': names,
+                              'number_of_subscribers': pd.to_numeric(pd.Series(subscribers, dtype=object)),
+                              'creation_epoch': pd.Series(created, dtype=object)})
+    # SRs are taken from their first line with a subscribers amount (lines before it are ignored)
+    first_valid = meta_data[meta_data['number_of_subscribers'].notna()].drop_duplicates(subset='subreddit_name')
+    meta_data = meta_data.groupby('subreddit_name', sort=False).agg({'number_of_subscribers': 'max',
+                                                                     'creation_epoch': 'last'})
+    meta_data = meta_data.reindex(first_valid['subreddit_name'])
+    meta_data['number_of_subscribers'] = meta_data['number_of_subscribers'].astype('int64')
+    meta_data['creation_epoch'] = pd.to_numeric(meta_data['creation_epoch'])
+    meta_data = meta_data.assign(created_utc_as_date=pd.to_datetime(meta_data['creation_epoch'], unit='s'))
+    meta_data.index.name = 'sr_name'
+    meta_data.insert(0, 'subreddit_name', meta_data.index)
+    return meta_data
+
+
+def _load_with_cache(source_path, build_func, cache_dir=None, cache_name_suffix=''):
+    """
+    loading a table built out of a source file, using a cached version of it if the source file has not changed
+    since. The cache is keyed by the source file size and modification time, and saved as a parquet file (pickle in
+    case the table cannot be saved as parquet, e.g., pyarrow is not installed). Cached versions of older source
+    files are removed
+    :param source_path: str
+        full path of the source file
+    :param build_func: function
+        function getting the source path and returning the table (pandas data-frame)
+    :param cache_dir: str or None, default: None
+        location of the cached table. If None - a '_sr_metadata_cache' folder next to the source file is used
+    :param cache_name_suffix: str, default: ''
+        added to the cache file name, in case a few tables are built out of the same source file
+    :return: pandas data-frame
+    """
+    cache_dir = os.path.join(os.path.dirname(source_path), cache_dir_name) if cache_dir is None else cache_dir
+    source_stat = os.stat(source_path)
+    cache_prefix = os.path.basename(source_path) + ('_' + cache_name_suffix if cache_name_suffix else '') + '_'
+    cache_name = cache_prefix + '{}_{}'.format(source_stat.st_size, source_stat.st_mtime_ns)
+    for suffix in ['.parquet', '.p']:
+        cache_file = os.path.join(cache_dir, cache_name + suffix)
+        if os.path.isfile(cache_file):
+            return pd.read_parquet(cache_file) if suffix == '.parquet' else pd.read_pickle(cache_file)
+    table = build_func(source_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    for f in os.listdir(cache_dir):
+        if f.startswith(cache_prefix) and f[len(cache_prefix):].split('.')[0].replace('_', '').isdigit():
+            os.remove(os.path.join(cache_dir, f))
+    cache_file = os.path.join(cache_dir, cache_name)
+    try:
+        table.to_parquet(cache_file + '.parquet.tmp')
+        os.replace(cache_file + '.parquet.tmp', cache_file + '.parquet')
+    except (ImportError, ValueError, TypeError):
+        # mixed types columns (common in excel sheets) cannot be saved as parquet
+        if os.path.isfile(cache_file + '.parquet.tmp'):
+            os.remove(cache_file + '.parquet.tmp')
+        with open(cache_file + '.p.tmp', 'wb') as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_file + '.p.tmp', cache_file + '.p')
+    return table
@@ -0,0 +1,273 @@
+# Authors: Abraham Israeli
+# Python version: 3.7
+# Last update: 26.01.2021
+
+import os
+import re
+import pickle
+import datetime
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from data_loaders.pushshift_io import iter_monthly_file_chunks, monthly_file_regex, list_monthly_files, file_fingerprint
+
+###################################################### Configurations ##################################################
+stats_columns = ['subreddit', 'author', 'created_utc_as_date']
+ignored_authors = {'[deleted]'}   # such authors are not counted as (distinct) authors of an SR
+partial_stats_dir_name = '_sr_statistics'   # sub folder (of the monthly files folder) holding the monthly statistics
+partial_stats_version = 2   # saved monthly statistics of other versions are calculated again
+first_seen_month_factor = 2**40   # 'first_seen' is the month ordinal times this factor plus the row number in the file
+########################################################################################################################
+
+
+def file_sr_statistics(file_path, encoding='utf-8', max_utc=None):
+    """
+    calculating the statistics of each SR in a single monthly file (submissions or comments). The file is read in
+    chunks, holding only the columns needed ('stats_columns'), and each chunk is aggregated right away (vectorized).
+    SR names are lower-cased
+    :param file_path: str
+        full path of the file
+    :param encoding: str, default: 'utf-8'
+        encoding of the file (relevant only to csv files)
+    :param max_utc: str or None, default: None
+        if given, only rows created before it ('YYYY-MM-DD HH:MM:SS' format) are taken into account
+    :return: dict
+        partial statistics, which can be merged with other ones using 'merge_sr_statistics'. It holds the 'sr_stats'
+        data-frame (index is the SR name, columns are 'submissions', 'first_activity', 'last_activity' and
+        'first_seen') and the 'sr_authors' data-frame (the distinct pairs of 'subreddit' and 'author').
+        'first_seen' is the position of the first row of the SR (the file month and the row number within the file),
+        used to order SRs with the same amount of submissions by their first appearance
+    """
+    chunks_stats = []
+    chunks_authors = []
+    file_month = pd.Period(re.match(monthly_file_regex, os.path.basename(file_path)).group(2), freq='M')
+    rows_offset = (file_month.year * 12 + file_month.month - 1) * first_seen_month_factor
+    for cur_chunk in iter_monthly_file_chunks(file_path=file_path, columns=stats_columns, encoding=encoding):
+        cur_chunk = pd.DataFrame({'subreddit': cur_chunk['subreddit'].astype(str).str.lower().to_numpy(),
+                                  'author': cur_chunk['author'].to_numpy(),
+                                  'date': pd.to_datetime(cur_chunk['created_utc_as_date']).to_numpy(),
+                                  'row': np.arange(rows_offset, rows_offset + len(cur_chunk), dtype='int64')})
+        rows_offset += len(cur_chunk)
+        if max_utc is not None:
+            cur_chunk = cur_chunk[cur_chunk['date'] < pd.Timestamp(max_utc)]
+        cur_chunk_stats = cur_chunk.groupby('subreddit', sort=False).agg(size=('date', 'size'), min=('date', 'min'),
+                                                                         max=('date', 'max'), row=('row', 'min'))
+        chunks_stats.append(cur_chunk_stats)
+        valid_authors = cur_chunk['author'].notna() & ~cur_chunk['author'].isin(ignored_authors)
+        chunks_authors.append(cur_chunk.loc[valid_authors, ['subreddit', 'author']].drop_duplicates())
+    return _combine(chunks_stats=chunks_stats, chunks_authors=chunks_authors)
+
+
+def merge_sr_statistics(partial_stats):
+    """
+    merging partial statistics (e.g., of a few months) into one. The merge is associative, so partial statistics can
+    be merged in any grouping and order
+    :param partial_stats: list
+        list of dicts, as returned by 'file_sr_statistics' (or by this function)
+    :return: dict
+        partial statistics of all the inputs together (same format as 'file_sr_statistics' returns)
+    """
+    chunks_stats = [ps['sr_stats'].rename(columns={'submissions': 'size', 'first_activity': 'min',
+                                                   'last_activity': 'max', 'first_seen': 'row'})
+                    for ps in partial_stats]
+    return _combine(chunks_stats=chunks_stats, chunks_authors=[ps['sr_authors'] for ps in partial_stats])
+
+
+def _combine(chunks_stats, chunks_authors):
+    if len(chunks_stats) == 0:
+        sr_stats = pd.DataFrame({'submissions': pd.Series(dtype='int64'),
+                                 'first_activity': pd.Series(dtype='datetime64[ns]'),
+                                 'last_activity': pd.Series(dtype='datetime64[ns]'),
+                                 'first_seen': pd.Series(dtype='int64')})
+        sr_stats.index.name = 'subreddit'
+        return {'sr_stats': sr_stats, 'sr_authors': pd.DataFrame(columns=['subreddit', 'author'])}
+    sr_stats = pd.concat(chunks_stats).groupby(level=0).agg({'size': 'sum', 'min': 'min', 'max': 'max', 'row': 'min'})
+    sr_stats.columns = ['submissions', 'first_activity', 'last_activity', 'first_seen']
+    sr_stats.index.name = 'subreddit'
+    sr_authors = pd.concat(chunks_authors, ignore_index=True).drop_duplicates(ignore_index=True)
+    return {'sr_stats': sr_stats, 'sr_authors': sr_authors}
+
+
+def sr_statistics_summary(partial_stats):
+    """
+    converting partial statistics into the final per-SR data-frame
+    :param partial_stats: dict
+        as returned by 'file_sr_statistics' or 'merge_sr_statistics'
+    :return: pandas data-frame
+        index is the SR name (lower-cased), columns are 'submissions', 'authors' (amount of distinct authors),
+        'first_activity' and 'last_activity'. Sorted by the amount of submissions (descending), SRs with the same amount
+        are ordered by their first appearance in the files (as the former Counter based calculation did)
+    """
+    sr_stats = partial_stats['sr_stats'].copy()
+    sr_stats['authors'] = partial_stats['sr_authors'].groupby('subreddit').size().reindex(sr_stats.index,
+                                                                                          fill_value=0)
+    sr_stats = sr_stats.sort_values(['submissions', 'first_seen'], ascending=[False, True], kind='stable')
+    return sr_stats[['submissions', 'authors', 'first_activity', 'last_activity']]
+
+
+def calc_monthly_sr_statistics(files_path, file_names, processes_amount=1, encoding='utf-8', max_utc=None):
+    """
+    calculating the partial statistics of each month. Files are handled in parallel (each one by a different process)
+    and files of the same month (in a partitioned folder, see 'pushshift_io.list_monthly_files') are merged
+    :param files_path: str
+        location of the files
+    :param file_names: list
+        names of the monthly files to be used (as returned by 'list_monthly_files')
+    :param processes_amount: int, default: 1
+        amount of files to handle in parallel. If 1 - files are handled one by one in the current process
+    :param encoding: str, default: 'utf-8'
+        encoding of the files (relevant only to csv files)
+    :param max_utc: str or None, default: None
+        if given, only rows created before it ('YYYY-MM-DD HH:MM:SS' format) are taken into account
+    :return: dict
+        the month (YYYY-MM format) as key, and its partial statistics (see 'file_sr_statistics') as value
+    """
+    start_time = datetime.datetime.now()
+    jobs = [(os.path.join(files_path, f), encoding, max_utc) for f in file_names]
+    files_stats = dict()
+    if processes_amount > 1 and len(jobs) > 1:
+        pool = mp.Pool(processes=min(processes_amount, len(jobs)))
+        with pool as pool:
+            for file_name, cur_stats in zip(file_names, pool.imap(_file_sr_statistics_job, jobs)):
+                files_stats[file_name] = cur_stats
+                _report_progress(file_name=file_name, files_done=len(files_stats), files_amount=len(jobs),
+                                 start_time=start_time)
+    else:
+        for file_name, job in zip(file_names, jobs):
+            files_stats[file_name] = _file_sr_statistics_job(job)
+            _report_progress(file_name=file_name, files_done=len(files_stats), files_amount=len(jobs),
+                             start_time=start_time)
+    stats_per_month = dict()
+    for month, month_files in _group_files_by_month(file_names).items():
+        month_stats = [files_stats[f] for f in month_files]
+        stats_per_month[month] = month_stats[0] if len(month_stats) == 1 else merge_sr_statistics(month_stats)
+    return stats_per_month
+
+
+def update_monthly_sr_statistics(files_path, prefix='RS', start_month=None, end_month=None, max_utc=None,
+                                 processes_amount=1, encoding='utf-8'):
+    """
+    loading the partial statistics of each month, calculating only the months which were not calculated before (or
+    whose files have changed since). The statistics of each month are saved separately under the '_sr_statistics'
+    folder of 'files_path', so adding a new month of data costs only the scan of this month.
+    In case a 'max_utc' is given, months which start after it are not taken into account, and the month it falls in
+    is calculated (and saved) as a different entry than the full month
+    :param files_path: str
+        location of the monthly files
+    :param prefix: str, default: 'RS'
+        either 'RS' (submissions) or 'RC' (comments)
+    :param start_month: str or None, default: None
+        the starting month in YYYY-MM format. If None - no lower limit is used
+    :param end_month: str or None, default: None
+        the ending month in YYYY-MM format. If None - no upper limit is used
+    :param max_utc: str or None, default: None
+        if given, only rows created before it ('YYYY-MM-DD HH:MM:SS' format) are taken into account
+    :param processes_amount: int, default: 1
+        amount of files to handle in parallel (only relevant to months which are calculated)
+    :param encoding: str, default: 'utf-8'
+        encoding of the files (relevant only to csv files)
+    :return: dict
+        the month (YYYY-MM format) as key, and its partial statistics (see 'file_sr_statistics') as value
+    """
+    file_names = list_monthly_files(files_path=files_path, prefix=prefix, start_month=start_month, end_month=end_month)
+    stats_dir = os.path.join(files_path, partial_stats_dir_name)
+    os.makedirs(stats_dir, exist_ok=True)
+    max_date = None if max_utc is None else pd.Timestamp(max_utc)
+    stats_per_month = dict()
+    entries_to_calc = dict()
+    for month, month_files in _group_files_by_month(file_names).items():
+        month_start = pd.Timestamp(month + '-01')
+        if max_date is not None and month_start >= max_date:
+            continue
+        # a 'max_utc' is relevant only to the month it falls in
+        month_max_utc = max_utc if max_date is not None and max_date < month_start + pd.offsets.MonthBegin(1) else None
+        entry_name = prefix + '_' + month if month_max_utc is None \
+            else '{}_{}_before_{}'.format(prefix, month, int(max_date.timestamp()))
+        fingerprints = {f: file_fingerprint(os.path.join(files_path, f))['hash'] for f in month_files}
+        entry_file = os.path.join(stats_dir, entry_name + '.p')
+        if os.path.isfile(entry_file):
+            with open(entry_file, 'rb') as f:
+                entry = pickle.load(f)
+            if entry.get('version') == partial_stats_version and entry['fingerprints'] == fingerprints:
+                stats_per_month[month] = entry['stats']
+                continue
+        entries_to_calc[month] = (month_files, month_max_utc, fingerprints, entry_file)
+    # months are calculated in groups of the same 'max_utc' (only the last month might have a different one)
+    for month_max_utc in {e[1] for e in entries_to_calc.values()}:
+        cur_months = [month for month, e in entries_to_calc.items() if e[1] == month_max_utc]
+        cur_stats = calc_monthly_sr_statistics(files_path=files_path,
+                                               file_names=[f for m in cur_months for f in entries_to_calc[m][0]],
+                                               processes_amount=processes_amount, encoding=encoding,
+                                               max_utc=month_max_utc)
+        for month in cur_months:
+            month_files, _, fingerprints, entry_file = entries_to_calc[month]
+            with open(entry_file + '.tmp', 'wb') as f:
+                pickle.dump({'version': partial_stats_version, 'fingerprints': fingerprints,
+                             'stats': cur_stats[month]}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(entry_file + '.tmp', entry_file)
+            stats_per_month[month] = cur_stats[month]
+    return {month: stats_per_month[month] for month in sorted(stats_per_month)}
+
+
+def load_sr_statistics(files_path, prefix='RS', start_month=None, end_month=None, max_utc=None, processes_amount=1,
+                       encoding='utf-8'):
+    """
+    the statistics of each SR along a range of months. Based on the monthly statistics saved by
+    'update_monthly_sr_statistics' (missing months are calculated and saved along the way). Parameters are the same
+    as in 'update_monthly_sr_statistics'
+    :return: pandas data-frame
+        as returned by 'sr_statistics_summary'
+    """
+    monthly_stats = update_monthly_sr_statistics(files_path=files_path, prefix=prefix, start_month=start_month,
+                                                 end_month=end_month, max_utc=max_utc,
+                                                 processes_amount=processes_amount, encoding=encoding)
+    return sr_statistics_summary(merge_sr_statistics(list(monthly_stats.values())))
+
+
+def monthly_sr_statistics_summary(monthly_stats):
+    """
+    converting the partial statistics of each month into one long data-frame
+    :param monthly_stats: dict
+        as returned by 'calc_monthly_sr_statistics'
+    :return: pandas data-frame
+        index is the month and the SR name, columns are the same as in 'sr_statistics_summary'
+    """
+    monthly_dfs = {month: sr_statistics_summary(month_stats) for month, month_stats in monthly_stats.items()}
+    if len(monthly_dfs) == 0:
+        return sr_statistics_summary(merge_sr_statistics([]))
+    return pd.concat(monthly_dfs, names=['month', 'subreddit'])
+
+
+def save_sr_statistics(sr_stats, saving_path, file_name):
+    """
+    saving a statistics data-frame (as returned by 'sr_statistics_summary' or 'monthly_sr_statistics_summary').
+    Parquet format is used, or pickle in case pyarrow is not installed
+    :return: str
+        full path of the saved file
+    """
+    try:
+        file_path = os.path.join(saving_path, file_name + '.parquet')
+        sr_stats.to_parquet(file_path)
+    except ImportError:
+        file_path = os.path.join(saving_path, file_name + '.p')
+        sr_stats.to_pickle(file_path)
+    return file_path
+
+
+def _file_sr_statistics_job(job):
+    file_path, encoding, max_utc = job
+    return file_sr_statistics(file_path=file_path, encoding=encoding, max_utc=max_utc)
+
+
+def _group_files_by_month(file_names):
+    files_per_month = dict()
+    for file_name in file_names:
+        cur_month = re.match(monthly_file_regex, os.path.basename(file_name)).group(2)
+        files_per_month.setdefault(cur_month, []).append(file_name)
+    return {month: files_per_month[month] for month in sorted(files_per_month)}
+
+
+def _report_progress(file_name, files_done, files_amount, start_time):
+    duration = (datetime.datetime.now() - start_time).seconds
+    print("Finished calculating SR statistics of file {}/{} called {}. Up to now took us {} seconds"
+          "".format(files_done, files_amount, file_name, duration), flush=True)
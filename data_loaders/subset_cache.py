@@ -0,0 +1,124 @@
+# Authors: Abraham Israeli
+# Python version: 3.7
+# Last update: 26.01.2021
+
+import os
+import json
+import pickle
+import hashlib
+import pandas as pd
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # the cache falls back to pickle files
+    pq = None
+from data_loaders.pushshift_io import file_fingerprint
+
+###################################################### Configurations ##################################################
+unordered_params = {'srs_to_include'}   # parameters which are a selection, so their order does not affect the subset
+########################################################################################################################
+
+
+class SubsetCache(object):
+    """
+    on-disk cache of the data-frames created by 'get_submissions_subset' / 'get_comments_subset'. Each data-frame is
+    saved under a content-addressed key: a hash of all the parameters which define it (SRs, months, utc bounds,
+    columns) and the fingerprints of the source files it was read from. Hence, a change in any of the source files
+    leads to a new key (and the old entry is eventually evicted). Values are saved as parquet files (pickle in case
+    pyarrow is not installed). Once the total size of the cache passes 'max_size_gb', least recently used entries
+    are removed
+
+    :param cache_dir: str
+        location of the cache files. Created in case it does not exist
+    :param max_size_gb: float, default: 20
+        maximum size (in GB) of all the cache files together
+    """
+    def __init__(self, cache_dir, max_size_gb=20):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_gb * 2**30)
+        self.file_suffix = '.parquet' if pq is not None else '.p'
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, kind, files_path, file_names, **params):
+        """
+        creating the key of a subset
+        :param kind: str
+            type of the data (e.g., 'submissions' or 'comments')
+        :param files_path: str
+            location of the source files
+        :param file_names: list
+            names of the source files (as returned by 'list_monthly_files')
+        :param params: dict
+            all other parameters which affect the subset (e.g., 'srs_to_include', 'min_utc', 'columns'). Sets and the
+            'unordered_params' (e.g., the SRs) are sorted, so the same SRs given in a different order lead to the same
+            key. Other lists keep their order, since it affects the subset (e.g., the order of the 'columns')
+        :return: str
+            sha1 hash (hex digest)
+        """
+        key_info = {'kind': kind,
+                    'files': [[f, file_fingerprint(os.path.join(files_path, f))['hash']] for f in file_names]}
+        for param_name, param_value in params.items():
+            if isinstance(param_value, (set, frozenset)) or \
+                    (param_name in unordered_params and isinstance(param_value, (list, tuple))):
+                param_value = sorted(param_value)
+            elif isinstance(param_value, tuple):
+                param_value = list(param_value)
+            key_info[param_name] = param_value
+        return hashlib.sha1(json.dumps(key_info, sort_keys=True).encode('UTF-8')).hexdigest()
+
+    def get(self, key):
+        """
+        loading a subset from the cache
+        :param key: str
+            as returned by 'make_key'
+        :return: pandas data-frame or None
+            None in case the key is not in the cache
+        """
+        file_path = self._key_path(key)
+        if not os.path.isfile(file_path):
+            self.stats['misses'] += 1
+            return None
+        df = pd.read_parquet(file_path) if self.file_suffix == '.parquet' else pd.read_pickle(file_path)
+        # the modification time is used as the 'last used' time of the entry
+        os.utime(file_path)
+        self.stats['hits'] += 1
+        return df
+
+    def put(self, key, df):
+        """
+        saving (atomically) a subset into the cache and evicting old entries if the cache is too big
+        :param key: str
+            as returned by 'make_key'
+        :param df: pandas data-frame
+            the subset to save
+        :return: None
+        """
+        file_path = self._key_path(key)
+        if self.file_suffix == '.parquet':
+            df.to_parquet(file_path + '.tmp', compression='zstd')
+        else:
+            with open(file_path + '.tmp', 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file_path + '.tmp', file_path)
+        self._evict()
+
+    def _key_path(self, key):
+        return os.path.join(self.cache_dir, key + self.file_suffix)
+
+    def _evict(self):
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(('.parquet', '.p')):
+                file_stat = os.stat(os.path.join(self.cache_dir, f))
+                entries.append((file_stat.st_mtime, file_stat.st_size, f))
+        total_size = sum(e[1] for e in entries)
+        # removing the least recently used entries first. The newest entry is kept even if it is bigger than the cap
+        for mtime, size, f in sorted(entries)[:-1]:
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, f))
+            except FileNotFoundError:  # another process has already removed it
+                pass
+            total_size -= size
+            self.stats['evictions'] += 1
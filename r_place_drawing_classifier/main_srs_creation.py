@@ -17,6 +17,7 @@ from nltk.corpus import stopwords
 from sklearn.feature_extraction.stop_words import ENGLISH_STOP_WORDS
 from r_place_drawing_classifier.utils import get_submissions_subset, get_comments_subset
 from data_loaders.general_loader import sr_sample_based_subscribers, sr_sample_based_submissions
+from data_loaders.subset_cache import SubsetCache
 from sr_classifier.reddit_data_preprocessing import RedditDataPrep
 from sr_classifier.sub_reddit import SubReddit
 import commentjson
@@ -30,6 +31,10 @@ config_dict = commentjson.load(open(os.path.join(os.getcwd(), 'config', 'srs_cre
 machine = '' # name of the machine to be used. This should be sync with the config file
 data_path = config_dict['data_dir'][machine]
 batch_number = 0
+# cache of the submissions/comments subsets, so reruns of the same batch do not filter the monthly files again
+subset_cache = SubsetCache(cache_dir=os.path.join(data_path, 'subset_cache'),
+                           max_size_gb=config_dict['subset_cache']['max_size_gb']) \
+    if eval(config_dict['subset_cache']['use_cache']) else None
 ########################################################################################################################
 
 
@@ -40,7 +45,7 @@ def _sr_creation(srs_mapping, submission_dp_obj, comments_dp_obj, srs_to_create,
     submission_data = get_submissions_subset(
         files_path=os.path.join(data_path, 'place_classifier_csvs'), srs_to_include=srs_to_create,
         start_month=config_dict['data_period']['start_month'], end_month=config_dict['data_period']['end_month'],
-        min_utc=None, max_utc='2017-03-29 00:00:00')
+        min_utc=None, max_utc='2017-03-29 00:00:00', cache=subset_cache)
 
     # same thing for the comments data
     if eval(config_dict['comments_usage']['meta_data']) or eval(config_dict['comments_usage']['corpus']):
@@ -48,7 +53,7 @@ def _sr_creation(srs_mapping, submission_dp_obj, comments_dp_obj, srs_to_create,
                                             srs_to_include=srs_to_create,
                                             start_month=config_dict['data_period']['start_month'],
                                             end_month=config_dict['data_period']['end_month'],
-                                            min_utc=None, max_utc='2017-03-29 00:00:00')
+                                            min_utc=None, max_utc='2017-03-29 00:00:00', cache=subset_cache)
     else:
         comments_data = None
 
@@ -3,23 +3,25 @@
 # Last update: 26.01.2021
 
 import datetime
-import pandas as pd
-import re
 import os
 import collections
 import pickle
 import sys
 import csv
 import random
+from data_loaders.pushshift_io import list_monthly_files, read_monthly_subsets, concat_monthly_frames
+from data_loaders.sr_statistics import update_monthly_sr_statistics, merge_sr_statistics, sr_statistics_summary, \
+    monthly_sr_statistics_summary, save_sr_statistics
 
 
 def get_submissions_subset(files_path, srs_to_include, start_month='2016-10', end_month='2017-03',
-                           min_utc=None, max_utc='2017-03-29 00:00:00'):
+                           min_utc=None, max_utc='2017-03-29 00:00:00', columns=None, workers_amount=None, cache=None):
     """
     pulling our subset of the submission data, which is related to the list of SRs given as input. This is very
-    simple "where" statement
+    simple "where" statement, which is applied along the reading of each file (see 'read_monthly_subset'). The
+    monthly files are read at the same time by a few threads
     :param files_path: string
-        location of the files to be used (.csv ones)
+        location of the files to be used (.csv or .parquet ones)
     :param srs_to_include: list (maybe set will also work here)
         list with SR names to be included in the returned dataset. Expected to be lowe-case ones.
         If None is given as input, then ALL subrddits are included
@@ -31,33 +33,38 @@ def get_submissions_subset(files_path, srs_to_include, start_month='2016-10', en
         the minimum timestamp to take into account. If None - no minimum time limitation is taken into account
     :param max_utc: string, default: '2017-03-29 00:00:00' (a day before the start time of r/place experiment)
         the maximum timestamp to take into account. If None - no minimum time limitation is taken into account
+    :param columns: list or None, default: None
+        columns to be loaded (see 'read_monthly_subset'). If None - all columns are loaded
+    :param workers_amount: int or None, default: None
+        amount of monthly files to read at the same time (see 'read_monthly_subsets'). If None - it is based on the
+        amount of files and cpus
+    :param cache: SubsetCache or None, default: None
+        cache of previous results (see 'data_loaders.subset_cache'). If None - no cache is used
     :return: pandas data-frame
         df including all relevant submission, related to the SRs given as input
     """
     start_time = datetime.datetime.now()
-    # finding all the relevant zip files in the 'data_path' directory
-    submission_files = [f for f in os.listdir(files_path) if re.match(r'RS.*\.csv', f) and 'sample' not in f]
-    # taking only the submissions files from 10-2016 to 03-2017
-    submission_files = [i for i in submission_files if
-                        ''.join(['RS_', start_month, '.csv']) <= i <= ''.join(['RS_', end_month, '.csv'])]
-    submission_files = sorted(submission_files)
-    submission_dfs = []
-    # iterating over each submission file
-    for subm_idx, cur_submission_file in enumerate(submission_files):
-        cur_submission_df = pd.read_csv(filepath_or_buffer=os.path.join(files_path, cur_submission_file), encoding='utf-8')
-        # filtering the data-frame based on the list of SRs we want to include and the date (before r/place started)
-        if srs_to_include is not None:
-            cur_submission_df = cur_submission_df[cur_submission_df["subreddit"].str.lower().isin(srs_to_include)]
-        # filtering based on min/max date
-        cur_min_utc = min(cur_submission_df['created_utc_as_date']) if min_utc is None else min_utc
-        cur_max_utc = max(cur_submission_df['created_utc_as_date']) if max_utc is None else max_utc
-        cur_submission_df = cur_submission_df[(cur_submission_df['created_utc_as_date'] >= cur_min_utc) &
-                                              (cur_submission_df['created_utc_as_date'] <= cur_max_utc)]
-        submission_dfs.append(cur_submission_df)
+    # finding all the relevant monthly files (from 10-2016 to 03-2017 by default) in the 'files_path' directory
+    submission_files = list_monthly_files(files_path=files_path, prefix='RS', start_month=start_month,
+                                          end_month=end_month, srs_to_include=srs_to_include)
+    if cache is not None:
+        cache_key = cache.make_key('submissions', files_path=files_path, file_names=submission_files,
+                                   srs_to_include=srs_to_include, min_utc=min_utc, max_utc=max_utc, columns=columns)
+        full_submissions_df = cache.get(cache_key)
+        if full_submissions_df is not None:
+            print(f"Function 'get_submission_subset_dataset' loaded the data from cache (cache stats: {cache.stats}). "
+                  f"Submission data-frame shape is {full_submissions_df.shape}", flush=True)
+            return full_submissions_df
+    # filtering the data based on the list of SRs we want to include and the date (before r/place started)
+    submission_dfs = read_monthly_subsets(files_path=files_path, file_names=submission_files,
+                                          workers_amount=workers_amount, srs_to_include=srs_to_include,
+                                          min_utc=min_utc, max_utc=max_utc, columns=columns, encoding='utf-8')
     if len(submission_dfs) == 0:
         raise IOError("No submission file was found")
 
-    full_submissions_df = pd.concat(submission_dfs)
+    full_submissions_df = concat_monthly_frames(submission_dfs)
+    if cache is not None:
+        cache.put(cache_key, full_submissions_df)
     duration = (datetime.datetime.now() - start_time).seconds
     print(f"Function 'get_submission_subset_dataset' has ended. Took us : {duration} seconds. "
           f"Submission data-frame shape created is {full_submissions_df.shape}", flush=True)
@@ -65,12 +72,13 @@ def get_submissions_subset(files_path, srs_to_include, start_month='2016-10', en
 
 
 def get_comments_subset(files_path, srs_to_include, start_month='2016-10', end_month='2017-03',
-                        min_utc=None, max_utc='2017-03-29 00:00:00'):
+                        min_utc=None, max_utc='2017-03-29 00:00:00', columns=None, workers_amount=None, cache=None):
     """
     pulling our subset of the commnets data, which is related to the list of SRs given as input. This is very
-    simple "where" statement
+    simple "where" statement, which is applied along the reading of each file (see 'read_monthly_subset'). The
+    monthly files are read at the same time by a few threads
     :param files_path: string
-        location of the files to be used (.csv ones)
+        location of the files to be used (.csv or .parquet ones)
     :param srs_to_include: list (maybe set will also work here)
         list with SR names to be included in the returned dataset. Expected to be lowe-case ones
         If None is given as input, then ALL subrddits are included
@@ -82,72 +90,83 @@ def get_comments_subset(files_path, srs_to_include, start_month='2016-10', end_m
         the minimum timestamp to take into account. If None - no minimum time limitation is taken into account
     :param max_utc: string, default: '2017-03-29 00:00:00' (a day before the start time of r/place experiment)
         the maximum timestamp to take into account. If None - no minimum time limitation is taken into account
+    :param columns: list or None, default: None
+        columns to be loaded (see 'read_monthly_subset'). If None - all columns are loaded
+    :param workers_amount: int or None, default: None
+        amount of monthly files to read at the same time (see 'read_monthly_subsets'). If None - it is based on the
+        amount of files and cpus
+    :param cache: SubsetCache or None, default: None
+        cache of previous results (see 'data_loaders.subset_cache'). If None - no cache is used
     :return: pandas data-frame
         df including all relevant submission, related to the SRs given as input
     """
     start_time = datetime.datetime.now()
     # pulling out all comment files in the desired range of months
-    comments_files = [f for f in os.listdir(files_path) if re.match(r'RC.*\.csv', f) and 'sample' not in f]
-    comments_files = [i for i in comments_files if
-                      ''.join(['RC_', start_month, '.csv']) <= i <= ''.join(['RC_', end_month, '.csv'])]
-    comments_files = sorted(comments_files)
-    comments_dfs = []
-    # looping over each file
-    for comm_idx, cur_comments_file in enumerate(comments_files):
-        if sys.platform == 'linux':
-            cur_comments_df = pd.read_csv(filepath_or_buffer=os.path.join(files_path, cur_comments_file), encoding='latin-1')
-        else:
-            cur_comments_df = pd.read_csv(filepath_or_buffer=os.path.join(files_path, cur_comments_file), encoding='latin-1')
-        if srs_to_include is not None:
-            cur_comments_df = cur_comments_df[cur_comments_df["subreddit"].str.lower().isin(srs_to_include)]
-        # filtering based on min/max date
-        cur_min_utc = min(cur_comments_df['created_utc_as_date']) if min_utc is None else min_utc
-        cur_max_utc = max(cur_comments_df['created_utc_as_date']) if max_utc is None else max_utc
-        cur_comments_df = cur_comments_df[(cur_comments_df['created_utc_as_date'] >= cur_min_utc) &
-                                          (cur_comments_df['created_utc_as_date'] <= cur_max_utc)]
-        comments_dfs.append(cur_comments_df)
+    comments_files = list_monthly_files(files_path=files_path, prefix='RC', start_month=start_month,
+                                        end_month=end_month, srs_to_include=srs_to_include)
+    if cache is not None:
+        cache_key = cache.make_key('comments', files_path=files_path, file_names=comments_files,
+                                   srs_to_include=srs_to_include, min_utc=min_utc, max_utc=max_utc, columns=columns)
+        full_comments_df = cache.get(cache_key)
+        if full_comments_df is not None:
+            print(f"Function 'get_comments_subset' loaded the data from cache (cache stats: {cache.stats}). "
+                  f"Comments data-frame shape is {full_comments_df.shape}", flush=True)
+            return full_comments_df
+    # filtering based on the SRs and the min/max date
+    comments_dfs = read_monthly_subsets(files_path=files_path, file_names=comments_files,
+                                        workers_amount=workers_amount, srs_to_include=srs_to_include,
+                                        min_utc=min_utc, max_utc=max_utc, columns=columns, encoding='latin-1')
     if len(comments_dfs) == 0:
         raise IOError("No comments file were found")
-    full_comments_df = pd.concat(comments_dfs)
+    full_comments_df = concat_monthly_frames(comments_dfs)
+    if cache is not None:
+        cache.put(cache_key, full_comments_df)
     duration = (datetime.datetime.now() - start_time).seconds
     print(f"Function 'get_comments_subset' has ended. Took us : {duration} seconds. "
           f"Comments data-frame shape created is {full_comments_df.shape}", flush=True)
     return full_comments_df
 
 
-def calc_sr_statistics(files_path, included_years, saving_res_path=os.getcwd()):
+def calc_sr_statistics(files_path, included_years, saving_res_path=os.getcwd(), processes_amount=1):
     """
     calculating relevant statistics to each sr found in the files given as input. This will be later used in order
-    to filter SRs with no submission/very small amount of submissions
+    to filter SRs with no submission/very small amount of submissions. Each file is read in chunks (only the columns
+    needed) and files are handled in parallel, see 'data_loaders.sr_statistics'. Statistics of each month are saved
+    (under the '_sr_statistics' folder of 'files_path'), so only months which were not handled before are calculated
     :param files_path: string
-        location of the files to be used (.csv ones)
+        location of the files to be used (.csv or .parquet ones)
     :param included_years: list
         list of years to include in the analysis
     :param saving_res_path: string
         location where to save results
+    :param processes_amount: int, default: 1
+        amount of files to handle in parallel (only relevant to months which were not handled before)
     :return: dictionary
-        dictionary with statistics to each SR. The function also saves the results as a pickle file
+        dictionary with two data-frames: 'per_sr' (statistics to each SR along all the months) and 'per_month'
+        (statistics to each SR in each month). Both hold the amount of submissions, distinct authors and the
+        first/last activity time. The function also saves the results as parquet files ('sr_statistics' and
+        'sr_monthly_statistics') and the amount of submissions to each SR as a pickle file (a Counter, the format
+        used by older versions)
     """
     start_time = datetime.datetime.now()
-    submission_files = [f for f in os.listdir(files_path) if re.match(r'RS.*\.csv', f)]
-    # taking only files which are in the 'included_years' subset
-    submission_files = [sf for sf in submission_files if any(str(year) in sf for year in included_years)]
-    # comments_files = [cf for cf in comments_files if any(str(year) in cf for year in included_years)]
-    submission_files = sorted(submission_files)
-    sr_statistics = collections.Counter()
-    for subm_idx, cur_submission_file in enumerate(submission_files):
-        cur_submission_df = pd.read_csv(filepath_or_buffer=os.path.join(files_path,cur_submission_file))
-        cur_sr_statistics = collections.Counter(cur_submission_df["subreddit"])
-        sr_statistics += cur_sr_statistics
-        # writing status to screen
-        duration = (datetime.datetime.now() - start_time).seconds
-        print("Ended loop # {}, up to now took us {} seconds".format(subm_idx, duration))
-    # saving the stats to a file
-    pickle.dump(sr_statistics, open(saving_res_path + "submission_stats_102016_to_032017.p", "wb"))
+    monthly_stats = update_monthly_sr_statistics(files_path=files_path, prefix='RS',
+                                                 start_month='{}-01'.format(min(included_years)),
+                                                 end_month='{}-12'.format(max(included_years)),
+                                                 processes_amount=processes_amount)
+    # taking only months which are in the 'included_years' subset
+    monthly_stats = {month: month_stats for month, month_stats in monthly_stats.items()
+                     if int(month[:4]) in {int(year) for year in included_years}}
+    per_sr = sr_statistics_summary(merge_sr_statistics(list(monthly_stats.values())))
+    per_month = monthly_sr_statistics_summary(monthly_stats)
+    # saving the stats to files
+    save_sr_statistics(sr_stats=per_sr, saving_path=saving_res_path, file_name='sr_statistics')
+    save_sr_statistics(sr_stats=per_month, saving_path=saving_res_path, file_name='sr_monthly_statistics')
+    sr_submissions = collections.Counter(per_sr['submissions'].to_dict())
+    pickle.dump(sr_submissions, open(saving_res_path + "submission_stats_102016_to_032017.p", "wb"))
     duration = (datetime.datetime.now() - start_time).seconds
     print("Function 'calc_sr_statistics' has ended. Took us : {} seconds. "
-          "Final dictionary size is {}".format(duration, len(sr_statistics)))
-    return sr_statistics
+          "Final dictionary size is {}".format(duration, per_sr.shape[0]))
+    return {'per_sr': per_sr, 'per_month': per_month}
 
 
 def save_results_to_csv(results_file, start_time, objects_amount, config_dict, results):